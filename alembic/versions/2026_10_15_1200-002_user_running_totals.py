@@ -0,0 +1,86 @@
+"""Add user_running_totals table with denormalized transaction totals
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-15 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+## Import Python Enum types for proper enum handling
+from src.models.transaction import TransactionType
+
+
+# revision identifiers, used by Alembic.
+revision: str = '002'
+down_revision: Union[str, None] = '001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """
+    Apply database changes.
+    
+    Creates user_running_totals table and backfills it from existing transactions,
+    so that all-time statistics become a single-row lookup.
+    """
+    
+    ## Import required SQLAlchemy utilities
+    from sqlalchemy import inspect
+    
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    
+    if 'user_running_totals' in inspector.get_table_names():
+        return
+    
+    running_totals = op.create_table(
+        'user_running_totals',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('total_income', sa.Numeric(precision=15, scale=2), nullable=False, server_default='0'),
+        sa.Column('total_expense', sa.Numeric(precision=15, scale=2), nullable=False, server_default='0'),
+        sa.Column('income_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('expense_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], name=op.f('fk_user_running_totals_user_id_users'), ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', name=op.f('pk_user_running_totals')),
+        comment='User transaction running totals'
+    )
+    
+    ## Backfill totals from existing transactions
+    transactions = sa.table(
+        'transactions',
+        sa.column('user_id', sa.Integer()),
+        sa.column('type', sa.Enum(TransactionType, name='transaction_type')),
+        sa.column('amount', sa.Numeric(precision=15, scale=2)),
+    )
+    
+    is_income = transactions.c.type == TransactionType.INCOME
+    is_expense = transactions.c.type == TransactionType.EXPENSE
+    
+    backfill = sa.select(
+        transactions.c.user_id,
+        sa.func.coalesce(sa.func.sum(sa.case((is_income, transactions.c.amount))), 0),
+        sa.func.coalesce(sa.func.sum(sa.case((is_expense, transactions.c.amount))), 0),
+        sa.func.count(sa.case((is_income, 1))),
+        sa.func.count(sa.case((is_expense, 1))),
+    ).group_by(transactions.c.user_id)
+    
+    op.execute(
+        running_totals.insert().from_select(
+            ['user_id', 'total_income', 'total_expense', 'income_count', 'expense_count'],
+            backfill
+        )
+    )
+
+
+def downgrade() -> None:
+    """
+    Rollback database changes.
+    
+    Drops user_running_totals table.
+    """
+    op.drop_table('user_running_totals')
@@ -0,0 +1,96 @@
+"""Replace transaction composite indexes with covering DESC indexes
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-15 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '003'
+down_revision: Union[str, None] = '002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """
+    Apply database changes.
+    
+    Rebuilds (user_id, created_at) as a DESC index covering type/amount/category_id,
+    replaces (user_id, type) with (user_id, type, created_at DESC) and adds
+    (user_id, is_default) for category lookups. INCLUDE is PostgreSQL-only.
+    """
+    
+    ## Import required SQLAlchemy utilities
+    from sqlalchemy import inspect
+    
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    
+    transaction_indexes = {index['name'] for index in inspector.get_indexes('transactions')}
+    category_indexes = {index['name'] for index in inspector.get_indexes('categories')}
+    
+    ## Pagination, period stats: WHERE user_id ORDER BY created_at DESC
+    if 'ix_transactions_user_created' in transaction_indexes:
+        op.drop_index('ix_transactions_user_created', table_name='transactions')
+    
+    op.create_index(
+        'ix_transactions_user_created',
+        'transactions',
+        ['user_id', sa.text('created_at DESC')],
+        unique=False,
+        postgresql_include=['type', 'amount', 'category_id']
+    )
+    
+    ## Same with type filter; its (user_id, type) prefix supersedes ix_transactions_user_type
+    if 'ix_transactions_user_type' in transaction_indexes:
+        op.drop_index('ix_transactions_user_type', table_name='transactions')
+    
+    if 'ix_transactions_user_type_created' not in transaction_indexes:
+        op.create_index(
+            'ix_transactions_user_type_created',
+            'transactions',
+            ['user_id', 'type', sa.text('created_at DESC')],
+            unique=False,
+            postgresql_include=['amount', 'category_id']
+        )
+    
+    ## User categories together with default ones
+    if 'ix_categories_user_default' not in category_indexes:
+        op.create_index(
+            'ix_categories_user_default',
+            'categories',
+            ['user_id', 'is_default'],
+            unique=False
+        )
+
+
+def downgrade() -> None:
+    """
+    Rollback database changes.
+    
+    Restores the plain composite indexes from the initial migration.
+    """
+    op.drop_index('ix_categories_user_default', table_name='categories')
+    
+    op.drop_index('ix_transactions_user_type_created', table_name='transactions')
+    op.create_index(
+        'ix_transactions_user_type',
+        'transactions',
+        ['user_id', 'type'],
+        unique=False
+    )
+    
+    op.drop_index('ix_transactions_user_created', table_name='transactions')
+    op.create_index(
+        'ix_transactions_user_created',
+        'transactions',
+        ['user_id', 'created_at'],
+        unique=False
+    )
@@ -154,7 +154,8 @@ async def main() -> None:
             await test_rate_limiter_backend("Redis", redis_backend)
             
             # Cleanup
-            await redis_client.delete("rate_limit:user:12345")
+            async for key in redis_client.scan_iter("rate_limit:user:12345:*"):
+                await redis_client.delete(key)
             await redis_client.close()
         except Exception as e:
             logger.error(f"❌ Ошибка тестирования Redis backend: {e}")
@@ -67,17 +67,22 @@ def test_config():
         print("\n⚙️ Checking configuration...")
         
         whisper_model = os.getenv("WHISPER_MODEL", "base")
+        whisper_quant = os.getenv("WHISPER_QUANT", "q5_1")
         whisper_threads = os.getenv("WHISPER_THREADS", "4")
         
         print(f"   WHISPER_MODEL: {whisper_model}")
+        print(f"   WHISPER_QUANT: {whisper_quant or '(full precision)'}")
         print(f"   WHISPER_THREADS: {whisper_threads}")
         
-        # Check if old config exists
-        whisper_device = os.getenv("WHISPER_DEVICE")
-        if whisper_device:
-            print("\n⚠️  Warning: WHISPER_DEVICE is set but no longer used")
-            print("   Remove it from .env and use WHISPER_THREADS instead")
-            return False
+        # WHISPER_DEVICE only applies to the faster-whisper backend
+        whisper_backend = os.getenv("WHISPER_BACKEND", "faster-whisper")
+        whisper_device = os.getenv("WHISPER_DEVICE", "cpu")
+        print(f"   WHISPER_BACKEND: {whisper_backend}")
+        if whisper_backend == "faster-whisper":
+            print(f"   WHISPER_DEVICE: {whisper_device}")
+        elif whisper_device != "cpu":
+            print("\n⚠️  Warning: WHISPER_DEVICE is only used by the faster-whisper backend")
+            print("   Whisper.cpp always runs on CPU with WHISPER_THREADS threads")
         
         print("✅ Configuration is correct")
         return True
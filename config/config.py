@@ -26,6 +26,12 @@ class Settings(BaseSettings):
     :ivar max_transaction_amount: Максимальная сумма транзакции
     :ivar rate_limit_requests: Количество запросов в период
     :ivar rate_limit_period: Период для rate limit в секундах
+    :ivar whisper_backend: Бэкенд распознавания речи (faster-whisper или whispercpp)
+    :ivar whisper_device: Устройство для faster-whisper (cpu или cuda)
+    :ivar whisper_model: Название модели Whisper
+    :ivar whisper_quant: Квантизация весов Whisper.cpp (q5_1, q8_0; пусто - без квантизации)
+    :ivar whisper_threads: Количество потоков CPU для Whisper
+    :ivar whisper_batch_size: Размер пачки фрагментов аудио для faster-whisper
     """
     
     bot_token: str = Field(..., validation_alias="BOT_TOKEN", description="Токен Telegram бота")
@@ -46,6 +52,14 @@ class Settings(BaseSettings):
     agentrouter_total_deadline: int = Field(default=25, validation_alias="AGENTROUTER_TOTAL_DEADLINE", description="Total deadline for all AgentRouter API attempts in seconds")
     agentrouter_max_text_length: int = Field(default=1000, validation_alias="AGENTROUTER_MAX_TEXT_LENGTH", description="Maximum length of text to send to AgentRouter API")
     
+    ## Whisper speech recognition settings
+    whisper_backend: str = Field(default="faster-whisper", validation_alias="WHISPER_BACKEND", description="Speech recognition backend: faster-whisper or whispercpp")
+    whisper_device: str = Field(default="cpu", validation_alias="WHISPER_DEVICE", description="Device for faster-whisper inference: cpu or cuda")
+    whisper_model: str = Field(default="base", validation_alias="WHISPER_MODEL", description="Whisper.cpp model name (e.g. base, base-q8_0)")
+    whisper_quant: str = Field(default="q5_1", validation_alias="WHISPER_QUANT", description="Whisper.cpp quantized weights suffix (e.g. q5_1, q8_0); empty for full precision")
+    whisper_threads: int = Field(default=4, ge=1, validation_alias="WHISPER_THREADS", description="Number of CPU threads for Whisper.cpp inference")
+    whisper_batch_size: int = Field(default=8, ge=1, validation_alias="WHISPER_BATCH_SIZE", description="Audio chunks per forward pass for faster-whisper batched inference")
+    
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
@@ -69,6 +83,55 @@ class Settings(BaseSettings):
             raise ValueError(f"Log level must be one of {allowed_levels}")
         return v_upper
     
+    @field_validator("whisper_backend")
+    @classmethod
+    def validate_whisper_backend(cls, v: str) -> str:
+        """
+        Валидация бэкенда распознавания речи.
+        
+        :param v: Название бэкенда
+        :return: Валидированное название в нижнем регистре
+        :raises ValueError: Если бэкенд не поддерживается
+        """
+        allowed_backends = ["whispercpp", "faster-whisper"]
+        v_lower = v.lower()
+        if v_lower not in allowed_backends:
+            raise ValueError(f"Whisper backend must be one of {allowed_backends}")
+        return v_lower
+    
+    @field_validator("whisper_device")
+    @classmethod
+    def validate_whisper_device(cls, v: str) -> str:
+        """
+        Валидация устройства для faster-whisper.
+        
+        :param v: Название устройства
+        :return: Валидированное название в нижнем регистре
+        :raises ValueError: Если устройство не поддерживается
+        """
+        allowed_devices = ["cpu", "cuda"]
+        v_lower = v.lower()
+        if v_lower not in allowed_devices:
+            raise ValueError(f"Whisper device must be one of {allowed_devices}")
+        return v_lower
+    
+    @field_validator("whisper_quant")
+    @classmethod
+    def validate_whisper_quant(cls, v: str) -> str:
+        """
+        Валидация квантизации весов Whisper.cpp.
+        
+        :param v: Суффикс квантизации (пустая строка - без квантизации)
+        :return: Валидированный суффикс в нижнем регистре
+        :raises ValueError: Если тип квантизации не поддерживается
+        """
+        ## Варианты, опубликованные whisper.cpp для tiny/base/small (ggml-*-q4_* не публикуются)
+        allowed_quants = ["", "q5_1", "q8_0"]
+        v_lower = v.strip().lower()
+        if v_lower not in allowed_quants:
+            raise ValueError(f"Whisper quantization must be one of {allowed_quants}")
+        return v_lower
+    
     @field_validator("max_transaction_amount")
     @classmethod
     def validate_max_amount(cls, v: int) -> int:
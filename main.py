@@ -17,17 +17,18 @@ from src.utils.logger import setup_logging
 from src.handlers import common, voice, transactions, view, categories, export, settings
 from src.models import init_db, create_tables, close_db
 from src.models import User, Category, Transaction  # Import models to register them in metadata
-from src.services.database import initialize_default_categories
+from src.services.database import initialize_default_categories, warm_up_statement_cache
 from src.middlewares import (
     RateLimitMiddleware,
     ErrorHandlerMiddleware,
+    DbSessionMiddleware,
 )
 from src.utils.validators import (
     initialize_rate_limiter,
     InMemoryRateLimiterBackend,
     RedisRateLimiterBackend,
 )
-from src.services.openrouter_service import initialize_whisper
+from src.services.openrouter_service import initialize_whisper, close_http_client
 
 
 ## Инициализация и запуск бота
@@ -88,14 +89,22 @@ async def main() -> None:
         safe_error = sanitize_exception_message(e)
         logger.error(f"⚠️ Ошибка инициализации категорий: {safe_error}")
     
+    try:
+        await warm_up_statement_cache()
+        logger.info("✅ Кэш подготовленных запросов прогрет")
+    except Exception as e:
+        from src.utils.sanitizer import sanitize_exception_message
+        safe_error = sanitize_exception_message(e)
+        logger.warning(f"⚠️ Ошибка прогрева кэша запросов: {safe_error}")
+    
     ## Initialize Whisper model for voice message processing
     try:
         await initialize_whisper()
-        logger.info("✅ Whisper.cpp инициализирован")
+        logger.info("✅ Whisper инициализирован")
     except Exception as e:
         from src.utils.sanitizer import sanitize_exception_message
         safe_error = sanitize_exception_message(e)
-        logger.error(f"⚠️ Ошибка инициализации Whisper.cpp: {safe_error}")
+        logger.error(f"⚠️ Ошибка инициализации Whisper: {safe_error}")
         logger.warning("Голосовые сообщения могут работать с задержкой при первом использовании")
     
     ## Initialize rate limiter with Redis or fallback to in-memory
@@ -156,6 +165,12 @@ async def main() -> None:
     dp.callback_query.middleware(ErrorHandlerMiddleware())
     logger.info("✅ Error handler активирован")
     
+    ## Одна сессия БД на обновление — только для handlers просмотра, которые принимают ``session``;
+    ## остальные открывают сессии сами, и глобальная сессия держала бы второе соединение.
+    ## Middleware роутера выполняется после error handler, поэтому откат идет до обработки ошибки
+    view.router.message.middleware(DbSessionMiddleware())
+    view.router.callback_query.middleware(DbSessionMiddleware())
+    
     dp.include_router(view.router)
     dp.include_router(settings.router)
     dp.include_router(categories.router)
@@ -179,11 +194,14 @@ async def main() -> None:
     finally:
         logger.info("🔄 Начинаю graceful shutdown...")
         await bot.session.close()
+        await close_http_client()
         await close_db()
         if redis_client:
             await redis_client.close()
             logger.info("✅ Redis соединение закрыто")
         logger.info("👋 Бот остановлен")
+        # Дожидаемся записи логов из очереди файлового обработчика
+        await logger.complete()
 
 
 if __name__ == "__main__":
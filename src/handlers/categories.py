@@ -10,7 +10,7 @@ from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from loguru import logger
 
-from src.states.category_states import CategoryStates
+from src.states import CategoryStates
 from src.keyboards.category_keyboards import (
     get_category_management_menu,
     get_category_type_keyboard,
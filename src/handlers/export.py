@@ -11,16 +11,16 @@ from datetime import datetime, timedelta, timezone
 from typing import Optional
 
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, FSInputFile
+from aiogram.types import Message, CallbackQuery, BufferedInputFile
 from aiogram.filters import Command, StateFilter
 from aiogram.fsm.context import FSMContext
 from loguru import logger
 
-from src.states.export_states import ExportStates
+from src.states import ExportStates
 from src.keyboards.export_keyboards import get_export_period_keyboard
 from src.keyboards.view_keyboards import get_main_menu_keyboard
 from src.services.database import get_or_create_user
-from src.services.export_service import generate_transactions_excel, cleanup_export_file
+from src.services.export_service import generate_transactions_excel
 
 
 router = Router(name="export")
@@ -144,15 +144,18 @@ async def handle_export_period(callback: CallbackQuery, state: FSMContext) -> No
     await callback.answer()
     
     try:
-        # Генерируем файл
-        file_path = await generate_transactions_excel(
+        # Генерируем файл в памяти
+        buffer = await generate_transactions_excel(
             user_id=user.id,
             start_date=start_date,
             end_date=end_date
         )
         
         # Отправляем файл
-        document = FSInputFile(file_path)
+        document = BufferedInputFile(
+            buffer.getvalue(),
+            filename=f"transactions_export_{user.id}_{now.strftime('%Y%m%d_%H%M%S')}.xlsx"
+        )
         
         await callback.message.answer_document(
             document=document,
@@ -171,9 +174,6 @@ async def handle_export_period(callback: CallbackQuery, state: FSMContext) -> No
         
         logger.success(f"✅ Файл экспорта отправлен пользователю {user.id}")
         
-        # Удаляем временный файл
-        cleanup_export_file(file_path)
-        
     except Exception as e:
         from src.utils.sanitizer import sanitize_exception_message
         safe_error = sanitize_exception_message(e)
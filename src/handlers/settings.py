@@ -14,7 +14,7 @@ from datetime import datetime, timezone
 
 from src.models import get_session, User
 from src.services.database import get_or_create_user, get_user_statistics
-from src.states.settings_states import SettingsStates
+from src.states import SettingsStates
 from src.keyboards.settings_keyboards import (
     get_settings_menu_keyboard,
     get_cancel_settings_keyboard,
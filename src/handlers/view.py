@@ -18,6 +18,7 @@ from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command, StateFilter
 from aiogram.fsm.context import FSMContext
+from sqlalchemy.ext.asyncio import AsyncSession
 from loguru import logger
 
 from src.states import ViewTransactionsStates, EditTransactionStates, AddTransactionStates
@@ -36,8 +37,7 @@ from src.services.database import (
     count_user_transactions,
     get_transaction_by_id,
     delete_transaction,
-    get_user_statistics,
-    get_top_expense_categories,
+    get_statistics_with_top_categories,
     update_transaction,
     get_categories,
 )
@@ -97,11 +97,12 @@ async def show_main_menu(callback: CallbackQuery, state: FSMContext) -> None:
 
 ## Команда /stats - статистика
 @router.message(Command("stats"))
-async def cmd_stats(message: Message) -> None:
+async def cmd_stats(message: Message, session: AsyncSession) -> None:
     """
     Показать статистику пользователя.
     
     :param message: Сообщение от пользователя
+    :param session: Сессия БД обновления (из DbSessionMiddleware)
     :return: None
     """
     user = await get_or_create_user(
@@ -109,18 +110,20 @@ async def cmd_stats(message: Message) -> None:
         username=message.from_user.username,
         first_name=message.from_user.first_name,
         last_name=message.from_user.last_name,
+        session=session,
     )
     
-    await show_statistics(message, user.id)
+    await show_statistics(message, user.id, session=session)
 
 
 ## Показать статистику (callback)
 @router.callback_query(F.data == "menu:stats")
-async def show_stats_callback(callback: CallbackQuery) -> None:
+async def show_stats_callback(callback: CallbackQuery, session: AsyncSession) -> None:
     """
     Показать статистику (callback).
     
     :param callback: Callback от inline кнопки
+    :param session: Сессия БД обновления (из DbSessionMiddleware)
     :return: None
     """
     user = await get_or_create_user(
@@ -128,9 +131,10 @@ async def show_stats_callback(callback: CallbackQuery) -> None:
         username=callback.from_user.username,
         first_name=callback.from_user.first_name,
         last_name=callback.from_user.last_name,
+        session=session,
     )
     
-    await show_statistics(callback.message, user.id, edit=True)
+    await show_statistics(callback.message, user.id, edit=True, session=session)
     await callback.answer()
 
 
@@ -194,7 +198,8 @@ async def show_statistics(
     user_id: int,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-    edit: bool = False
+    edit: bool = False,
+    session: Optional[AsyncSession] = None
 ) -> None:
     """
     Отобразить статистику пользователя.
@@ -204,13 +209,17 @@ async def show_statistics(
     :param start_date: Начало периода
     :param end_date: Конец периода
     :param edit: Редактировать ли существующее сообщение
+    :param session: Сессия БД обновления (опционально)
     :return: None
     """
-    # Получаем статистику
-    stats = await get_user_statistics(user_id, start_date, end_date)
+    # Получаем статистику и топ категорий расходов одним запросом
+    stats, top_categories = await get_statistics_with_top_categories(
+        user_id, start_date, end_date, limit=3, session=session
+    )
     
-    # Получаем топ категорий расходов
-    top_categories = await get_top_expense_categories(user_id, start_date, end_date, limit=3)
+    ## Завершаем транзакцию до ответа в Telegram: соединение и блокировки не держим на время сетевого запроса
+    if session is not None:
+        await session.commit()
     
     # Определяем период для заголовка
     if not start_date and not end_date:
@@ -244,11 +253,12 @@ async def show_statistics(
 
 ## Просмотр всех транзакций
 @router.message(Command("transactions"))
-async def cmd_transactions(message: Message) -> None:
+async def cmd_transactions(message: Message, session: AsyncSession) -> None:
     """
     Показать все транзакции пользователя.
     
     :param message: Сообщение от пользователя
+    :param session: Сессия БД обновления (из DbSessionMiddleware)
     :return: None
     """
     user = await get_or_create_user(
@@ -256,18 +266,20 @@ async def cmd_transactions(message: Message) -> None:
         username=message.from_user.username,
         first_name=message.from_user.first_name,
         last_name=message.from_user.last_name,
+        session=session,
     )
     
-    await show_transactions_list(message, user.id, page=1, transaction_type=None)
+    await show_transactions_list(message, user.id, page=1, transaction_type=None, session=session)
 
 
 ## Callback для просмотра транзакций
 @router.callback_query(F.data.startswith("menu:"))
-async def handle_menu_callback(callback: CallbackQuery) -> None:
+async def handle_menu_callback(callback: CallbackQuery, session: AsyncSession) -> None:
     """
     Обработать выбор в главном меню.
     
     :param callback: Callback от inline кнопки
+    :param session: Сессия БД обновления (из DbSessionMiddleware)
     :return: None
     """
     action = callback.data.split(":")[1]
@@ -277,17 +289,23 @@ async def handle_menu_callback(callback: CallbackQuery) -> None:
         username=callback.from_user.username,
         first_name=callback.from_user.first_name,
         last_name=callback.from_user.last_name,
+        session=session,
     )
     
+    ## Завершаем транзакцию до ответа в Telegram (ветки period/settings не читают БД дальше)
+    await session.commit()
+    
     if action == "all":
-        await show_transactions_list(callback.message, user.id, page=1, edit=True)
+        await show_transactions_list(callback.message, user.id, page=1, edit=True, session=session)
     elif action == "income":
         await show_transactions_list(
-            callback.message, user.id, page=1, transaction_type=TransactionType.INCOME, edit=True
+            callback.message, user.id, page=1, transaction_type=TransactionType.INCOME,
+            edit=True, session=session
         )
     elif action == "expense":
         await show_transactions_list(
-            callback.message, user.id, page=1, transaction_type=TransactionType.EXPENSE, edit=True
+            callback.message, user.id, page=1, transaction_type=TransactionType.EXPENSE,
+            edit=True, session=session
         )
     elif action == "period":
         await callback.message.edit_text(
@@ -313,7 +331,8 @@ async def show_transactions_list(
     transaction_type: Optional[TransactionType] = None,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-    edit: bool = False
+    edit: bool = False,
+    session: Optional[AsyncSession] = None
 ) -> None:
     """
     Отобразить список транзакций с пагинацией.
@@ -325,13 +344,35 @@ async def show_transactions_list(
     :param start_date: Начало периода
     :param end_date: Конец периода
     :param edit: Редактировать ли существующее сообщение
+    :param session: Сессия БД обновления (опционально)
     :return: None
     """
     # Подсчитываем общее количество транзакций
     total_count = await count_user_transactions(
-        user_id, transaction_type, start_date, end_date
+        user_id, transaction_type, start_date, end_date, session=session
     )
     
+    # Вычисляем пагинацию
+    total_pages = math.ceil(total_count / TRANSACTIONS_PER_PAGE)
+    offset = (page - 1) * TRANSACTIONS_PER_PAGE
+    
+    # Получаем транзакции
+    transactions = []
+    if total_count:
+        transactions = await get_user_transactions_with_filters(
+            user_id=user_id,
+            transaction_type=transaction_type,
+            start_date=start_date,
+            end_date=end_date,
+            limit=TRANSACTIONS_PER_PAGE,
+            offset=offset,
+            session=session
+        )
+    
+    ## Завершаем транзакцию до ответа в Telegram: соединение и блокировки не держим на время сетевого запроса
+    if session is not None:
+        await session.commit()
+    
     if total_count == 0:
         text = "📝 <b>Транзакции не найдены</b>\n\n"
         if transaction_type == TransactionType.INCOME:
@@ -347,20 +388,6 @@ async def show_transactions_list(
             await message.answer(text, reply_markup=get_main_menu_keyboard())
         return
     
-    # Вычисляем пагинацию
-    total_pages = math.ceil(total_count / TRANSACTIONS_PER_PAGE)
-    offset = (page - 1) * TRANSACTIONS_PER_PAGE
-    
-    # Получаем транзакции
-    transactions = await get_user_transactions_with_filters(
-        user_id=user_id,
-        transaction_type=transaction_type,
-        start_date=start_date,
-        end_date=end_date,
-        limit=TRANSACTIONS_PER_PAGE,
-        offset=offset
-    )
-    
     # Формируем заголовок
     if transaction_type == TransactionType.INCOME:
         header = "💰 <b>Доходы</b>"
@@ -380,7 +407,7 @@ async def show_transactions_list(
         
         text += (
             f"📅 {date_str}\n"
-            f"{type_emoji} <b>{sign}{float(tr.amount):.2f} ₽</b> | {tr.category.emoji} {tr.category.name}\n"
+            f"{type_emoji} <b>{sign}{float(tr.amount):.2f} ₽</b> | {tr.category_emoji} {tr.category_name}\n"
         )
         
         if tr.description:
@@ -407,11 +434,12 @@ async def show_transactions_list(
 
 ## Навигация по страницам
 @router.callback_query(F.data.startswith("nav:"))
-async def handle_navigation(callback: CallbackQuery) -> None:
+async def handle_navigation(callback: CallbackQuery, session: AsyncSession) -> None:
     """
     Обработать навигацию по страницам транзакций.
     
     :param callback: Callback от inline кнопки
+    :param session: Сессия БД обновления (из DbSessionMiddleware)
     :return: None
     """
     parts = callback.data.split(":")
@@ -436,21 +464,24 @@ async def handle_navigation(callback: CallbackQuery) -> None:
         username=callback.from_user.username,
         first_name=callback.from_user.first_name,
         last_name=callback.from_user.last_name,
+        session=session,
     )
     
     await show_transactions_list(
-        callback.message, user.id, page=page, transaction_type=transaction_type, edit=True
+        callback.message, user.id, page=page, transaction_type=transaction_type,
+        edit=True, session=session
     )
     await callback.answer()
 
 
 ## Обработка фильтров по периоду
 @router.callback_query(F.data.startswith("period:"))
-async def handle_period_filter(callback: CallbackQuery) -> None:
+async def handle_period_filter(callback: CallbackQuery, session: AsyncSession) -> None:
     """
     Обработать выбор периода для фильтрации.
     
     :param callback: Callback от inline кнопки
+    :param session: Сессия БД обновления (из DbSessionMiddleware)
     :return: None
     """
     period = callback.data.split(":")[1]
@@ -460,6 +491,7 @@ async def handle_period_filter(callback: CallbackQuery) -> None:
         username=callback.from_user.username,
         first_name=callback.from_user.first_name,
         last_name=callback.from_user.last_name,
+        session=session,
     )
     
     now = datetime.now(timezone.utc)
@@ -483,7 +515,8 @@ async def handle_period_filter(callback: CallbackQuery) -> None:
         end_date = None
     
     await show_transactions_list(
-        callback.message, user.id, page=1, start_date=start_date, end_date=end_date, edit=True
+        callback.message, user.id, page=1, start_date=start_date, end_date=end_date,
+        edit=True, session=session
     )
     await callback.answer()
 
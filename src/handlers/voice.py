@@ -8,8 +8,6 @@
 - Отмены операции
 """
 
-import os
-from pathlib import Path
 from typing import Optional
 
 from aiogram import Router, F
@@ -34,6 +32,7 @@ from src.services.database import (
 from src.services.openrouter_service import (
     transcribe_audio,
     parse_transaction_text,
+    try_parse_local,
     find_matching_category,
     TranscriptionError,
     ParsingError,
@@ -43,6 +42,10 @@ from src.models import CategoryType, TransactionType
 
 router = Router(name="voice")
 
+## Ограничения голосового сообщения: аудио и его PCM (~64 КБ/с) целиком держатся в памяти
+MAX_VOICE_DURATION = 300
+MAX_VOICE_FILE_SIZE = 5 * 1024 * 1024
+
 
 ## Обработка голосового сообщения
 @router.message(F.voice)
@@ -57,6 +60,23 @@ async def handle_voice_message(message: Message, state: FSMContext) -> None:
     :param state: FSM context
     :return: None
     """
+    voice: Voice = message.voice
+    
+    ## Слишком длинные или тяжелые сообщения отклоняются до скачивания и распознавания
+    if voice.duration > MAX_VOICE_DURATION:
+        await message.answer(
+            f"❌ Голосовое сообщение слишком длинное (максимум {MAX_VOICE_DURATION // 60} минут).\n\n"
+            "Запишите короче или используйте /add"
+        )
+        return
+    
+    if (voice.file_size or 0) > MAX_VOICE_FILE_SIZE:
+        await message.answer(
+            f"❌ Голосовое сообщение слишком большое (максимум {MAX_VOICE_FILE_SIZE // (1024 * 1024)} МБ).\n\n"
+            "Запишите короче или используйте /add"
+        )
+        return
+    
     user = await get_or_create_user(
         telegram_id=message.from_user.id,
         username=message.from_user.username,
@@ -66,26 +86,20 @@ async def handle_voice_message(message: Message, state: FSMContext) -> None:
     
     processing_msg = await message.answer("🎤 Обрабатываю голосовое сообщение...")
     
-    voice: Voice = message.voice
-    audio_path = None
-    
     try:
         file = await message.bot.get_file(voice.file_id)
         
-        temp_dir = Path("temp_audio")
-        temp_dir.mkdir(exist_ok=True)
-        
-        audio_path = temp_dir / f"{message.from_user.id}_{voice.file_unique_id}.ogg"
-        
-        await message.bot.download_file(file.file_path, audio_path)
-        logger.info(f"Голосовое сообщение сохранено: {audio_path}")
+        ## Голосовое скачивается в память и декодируется без временного файла
+        audio = await message.bot.download_file(file.file_path)
+        logger.info(f"Голосовое сообщение загружено: {voice.file_unique_id} ({voice.duration} с)")
         
         await processing_msg.edit_text("🎧 Распознаю речь...")
-        text = await transcribe_audio(str(audio_path))
+        text = await transcribe_audio(audio.getvalue())
         logger.info(f"Текст распознан: {text}")
         
         await processing_msg.edit_text("🤔 Анализирую текст...")
-        transaction_data = await parse_transaction_text(text)
+        ## Простые фразы ("такси 500") разбираются локально, остальное уходит в LLM
+        transaction_data = try_parse_local(text) or await parse_transaction_text(text)
         
         if not transaction_data:
             await processing_msg.edit_text(
@@ -156,13 +170,6 @@ async def handle_voice_message(message: Message, state: FSMContext) -> None:
             "❌ Произошла ошибка при обработке голосового сообщения.\n\n"
             "Попробуйте еще раз или используйте /add"
         )
-    finally:
-        if audio_path and audio_path.exists():
-            try:
-                os.remove(audio_path)
-                logger.debug(f"Временный файл удален: {audio_path}")
-            except Exception as e:
-                logger.warning(f"Не удалось удалить временный файл: {e}")
 
 
 ## Показ подтверждения голосовой транзакции
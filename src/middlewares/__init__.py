@@ -6,11 +6,13 @@ Middlewares для бота.
 
 from .rate_limit import RateLimitMiddleware, StrictRateLimitMiddleware
 from .error_handler import ErrorHandlerMiddleware, database_fallback_message, api_fallback_message
+from .db_session import DbSessionMiddleware
 
 __all__ = [
     "RateLimitMiddleware",
     "StrictRateLimitMiddleware",
     "ErrorHandlerMiddleware",
+    "DbSessionMiddleware",
     "database_fallback_message",
     "api_fallback_message",
 ]
@@ -0,0 +1,47 @@
+"""
+Middleware для сессии БД на время обработки обновления.
+
+Открывает одну сессию на Telegram-обновление и передает ее в handlers.
+"""
+
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+from src.models import get_session
+
+
+## Middleware сессии БД
+class DbSessionMiddleware(BaseMiddleware):
+    """
+    Middleware, открывающий одну сессию БД на обработку обновления.
+    
+    Сессия доступна в handlers как аргумент ``session`` и передается
+    в функции ``src.services.database`` через параметр ``session``.
+    Соединение из пула берется лениво (при первом запросе), откат — при исключении.
+    Handler должен вызвать ``session.commit()`` после чтения данных и до ответа
+    в Telegram, чтобы соединение и блокировки строк не удерживались на время
+    сетевого запроса. Функции записи (``create_transaction``, ``update_transaction``
+    и т.п.) коммитят сессию сами; остальное коммитится после handler.
+    
+    Регистрируется на роутере просмотра (``src.handlers.view``): только его
+    handlers принимают ``session``, остальные открывают сессии сами.
+    """
+    
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        """
+        Обработка события в рамках одной сессии БД.
+        
+        :param handler: Следующий обработчик в цепочке
+        :param event: Объект обновления от Telegram
+        :param data: Дополнительные данные
+        :return: Результат выполнения обработчика
+        """
+        async with get_session() as session:
+            data["session"] = session
+            return await handler(event, data)
@@ -8,6 +8,7 @@ from .base import Base, TimestampMixin, init_db, create_tables, get_session, clo
 from .user import User
 from .category import Category, CategoryType
 from .transaction import Transaction, TransactionType
+from .user_running_total import UserRunningTotal
 
 __all__ = [
     "Base",
@@ -22,4 +23,5 @@ __all__ = [
     "CategoryType",
     "Transaction",
     "TransactionType",
+    "UserRunningTotal",
 ]
@@ -5,9 +5,10 @@
 """
 
 from datetime import datetime
+from decimal import Decimal
 from typing import AsyncGenerator
 from contextlib import asynccontextmanager
-from sqlalchemy import MetaData, DateTime
+from sqlalchemy import MetaData, DateTime, event
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 from sqlalchemy.sql import func
@@ -46,10 +47,16 @@ class TimestampMixin:
     """
     Миксин для автоматического добавления временных меток создания и обновления.
     
+    Включает ``eager_defaults``: серверные значения временных меток возвращаются
+    через ``INSERT/UPDATE ... RETURNING`` в том же запросе, поэтому после
+    commit не нужен отдельный ``session.refresh()``.
+    
     :ivar created_at: Дата и время создания записи (timezone-aware UTC)
     :ivar updated_at: Дата и время последнего обновления записи (timezone-aware UTC)
     """
     
+    __mapper_args__ = {"eager_defaults": True}
+    
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         server_default=func.now(),
@@ -70,6 +77,30 @@ engine = None
 async_session_maker = None
 
 
+## Кодек NUMERIC для asyncpg
+def _register_numeric_codec(dbapi_connection, connection_record) -> None:
+    """
+    Зарегистрировать текстовый кодек NUMERIC на новом соединении asyncpg.
+    
+    Значения NUMERIC передаются в текстовом формате и разбираются одним
+    вызовом ``Decimal(str)`` (C-реализация) вместо разбора бинарного
+    представления по цифрам base-10000.
+    
+    :param dbapi_connection: DBAPI-адаптер соединения asyncpg
+    :param connection_record: Запись пула соединений
+    :return: None
+    """
+    dbapi_connection.run_async(
+        lambda connection: connection.set_type_codec(
+            "numeric",
+            encoder=str,
+            decoder=Decimal,
+            schema="pg_catalog",
+            format="text"
+        )
+    )
+
+
 def init_db() -> None:
     """
     Инициализация подключения к базе данных.
@@ -107,6 +138,9 @@ def init_db() -> None:
         **engine_kwargs
     )
     
+    if engine.dialect.driver == "asyncpg":
+        event.listen(engine.sync_engine, "connect", _register_numeric_codec)
+    
     async_session_maker = async_sessionmaker(
         engine,
         class_=AsyncSession,
@@ -6,7 +6,7 @@
 
 from typing import List, TYPE_CHECKING
 from enum import Enum as PyEnum
-from sqlalchemy import String, Boolean, ForeignKey, Enum
+from sqlalchemy import String, Boolean, ForeignKey, Enum, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .base import Base, TimestampMixin
@@ -49,7 +49,11 @@ class Category(Base, TimestampMixin):
     """
     
     __tablename__ = "categories"
-    __table_args__ = {"comment": "Категории доходов и расходов"}
+    __table_args__ = (
+        ## Выборка категорий пользователя вместе с предустановленными
+        Index("ix_categories_user_default", "user_id", "is_default"),
+        {"comment": "Категории доходов и расходов"},
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     
@@ -60,7 +64,8 @@ class Category(Base, TimestampMixin):
     )
     
     type: Mapped[CategoryType] = mapped_column(
-        Enum(CategoryType, name="category_type"),
+        ## Нативный ENUM в PostgreSQL: 4 байта на строку, без CHECK-ограничения
+        Enum(CategoryType, name="category_type", native_enum=True, create_constraint=False),
         nullable=False,
         index=True,
         comment="Тип категории (доход/расход)"
@@ -7,7 +7,7 @@
 from typing import TYPE_CHECKING
 from enum import Enum as PyEnum
 from decimal import Decimal
-from sqlalchemy import String, Numeric, ForeignKey, Enum, Text
+from sqlalchemy import String, Numeric, ForeignKey, Enum, Text, Index, desc
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .base import Base, TimestampMixin
@@ -49,7 +49,24 @@ class Transaction(Base, TimestampMixin):
     """
     
     __tablename__ = "transactions"
-    __table_args__ = {"comment": "Финансовые транзакции пользователей"}
+    __table_args__ = (
+        ## Лента и статистика пользователя: WHERE user_id ORDER BY created_at DESC
+        Index(
+            "ix_transactions_user_created",
+            "user_id",
+            desc("created_at"),
+            postgresql_include=["type", "amount", "category_id"],
+        ),
+        ## То же с фильтром по типу (доходы/расходы, топ категорий)
+        Index(
+            "ix_transactions_user_type_created",
+            "user_id",
+            "type",
+            desc("created_at"),
+            postgresql_include=["amount", "category_id"],
+        ),
+        {"comment": "Финансовые транзакции пользователей"},
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     
@@ -61,7 +78,8 @@ class Transaction(Base, TimestampMixin):
     )
     
     type: Mapped[TransactionType] = mapped_column(
-        Enum(TransactionType, name="transaction_type"),
+        ## Нативный ENUM в PostgreSQL: 4 байта на строку, без CHECK-ограничения
+        Enum(TransactionType, name="transaction_type", native_enum=True, create_constraint=False),
         nullable=False,
         index=True,
         comment="Тип транзакции (доход/расход)"
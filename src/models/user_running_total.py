@@ -0,0 +1,74 @@
+"""
+Модель накопительных итогов пользователя.
+
+Хранит денормализованные суммы и количество транзакций по типам,
+чтобы статистика "за всё время" читалась одной строкой вместо SUM по всем транзакциям.
+"""
+
+from decimal import Decimal
+from sqlalchemy import ForeignKey, Numeric
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base
+
+
+## Модель накопительных итогов
+class UserRunningTotal(Base):
+    """
+    Накопительные итоги доходов и расходов пользователя.
+    
+    Обновляется атомарно в том же коммите, что и создание, изменение
+    или удаление транзакций (см. ``src.services.database``).
+    
+    :ivar user_id: ID пользователя (первичный ключ)
+    :ivar total_income: Сумма всех доходов
+    :ivar total_expense: Сумма всех расходов
+    :ivar income_count: Количество транзакций дохода
+    :ivar expense_count: Количество транзакций расхода
+    """
+    
+    __tablename__ = "user_running_totals"
+    __table_args__ = {"comment": "Накопительные итоги транзакций пользователей"}
+    
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True,
+        comment="ID пользователя"
+    )
+    
+    total_income: Mapped[Decimal] = mapped_column(
+        Numeric(precision=15, scale=2),
+        nullable=False,
+        default=Decimal("0"),
+        server_default="0",
+        comment="Сумма доходов (в рублях)"
+    )
+    
+    total_expense: Mapped[Decimal] = mapped_column(
+        Numeric(precision=15, scale=2),
+        nullable=False,
+        default=Decimal("0"),
+        server_default="0",
+        comment="Сумма расходов (в рублях)"
+    )
+    
+    income_count: Mapped[int] = mapped_column(
+        nullable=False,
+        default=0,
+        server_default="0",
+        comment="Количество доходов"
+    )
+    
+    expense_count: Mapped[int] = mapped_column(
+        nullable=False,
+        default=0,
+        server_default="0",
+        comment="Количество расходов"
+    )
+    
+    def __repr__(self) -> str:
+        """Строковое представление итогов."""
+        return (
+            f"<UserRunningTotal(user_id={self.user_id}, total_income={self.total_income}, "
+            f"total_expense={self.total_expense})>"
+        )
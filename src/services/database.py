@@ -4,11 +4,16 @@
 Содержит функции для инициализации БД и предустановленных категорий.
 """
 
-from typing import Optional
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Optional, AsyncIterator, NamedTuple
 from datetime import datetime, timedelta
 from decimal import Decimal
-from sqlalchemy import select, func, and_
-from sqlalchemy.orm import selectinload
+from sqlalchemy import select, insert, func, and_, or_, case, cast, literal, null, union_all, Float, String, Row, Select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload, raiseload
 from loguru import logger
 
 from src.models import (
@@ -18,31 +23,305 @@ from src.models import (
     CategoryType,
     Transaction,
     TransactionType,
+    UserRunningTotal,
 )
 
 
+## Описание предустановленной категории
+class DefaultCategory(NamedTuple):
+    """
+    Неизменяемое описание предустановленной категории.
+    
+    :ivar name: Название категории
+    :ivar emoji: Эмодзи категории
+    :ivar type: Тип категории (доход/расход)
+    """
+    
+    name: str
+    emoji: str
+    type: CategoryType
+
+
 ## Предустановленные категории расходов
-DEFAULT_EXPENSE_CATEGORIES = [
-    {"name": "Продукты", "emoji": "🛒"},
-    {"name": "Дом и ЖКХ", "emoji": "🏠"},
-    {"name": "Транспорт", "emoji": "🚗"},
-    {"name": "Здоровье", "emoji": "🏥"},
-    {"name": "Одежда", "emoji": "👕"},
-    {"name": "Развлечения", "emoji": "🎬"},
-    {"name": "Рестораны и кафе", "emoji": "🍽"},
-    {"name": "Связь и интернет", "emoji": "📱"},
-    {"name": "Аптека", "emoji": "💊"},
-    {"name": "Другое", "emoji": "✏️"},
-]
+DEFAULT_EXPENSE_CATEGORIES: tuple[DefaultCategory, ...] = (
+    DefaultCategory("Продукты", "🛒", CategoryType.EXPENSE),
+    DefaultCategory("Дом и ЖКХ", "🏠", CategoryType.EXPENSE),
+    DefaultCategory("Транспорт", "🚗", CategoryType.EXPENSE),
+    DefaultCategory("Здоровье", "🏥", CategoryType.EXPENSE),
+    DefaultCategory("Одежда", "👕", CategoryType.EXPENSE),
+    DefaultCategory("Развлечения", "🎬", CategoryType.EXPENSE),
+    DefaultCategory("Рестораны и кафе", "🍽", CategoryType.EXPENSE),
+    DefaultCategory("Связь и интернет", "📱", CategoryType.EXPENSE),
+    DefaultCategory("Аптека", "💊", CategoryType.EXPENSE),
+    DefaultCategory("Другое", "✏️", CategoryType.EXPENSE),
+)
 
 ## Предустановленные категории доходов
-DEFAULT_INCOME_CATEGORIES = [
-    {"name": "Зарплата", "emoji": "💼"},
-    {"name": "Фриланс", "emoji": "💰"},
-    {"name": "Подарок", "emoji": "🎁"},
-    {"name": "Инвестиции", "emoji": "📈"},
-    {"name": "Другое", "emoji": "✏️"},
-]
+DEFAULT_INCOME_CATEGORIES: tuple[DefaultCategory, ...] = (
+    DefaultCategory("Зарплата", "💼", CategoryType.INCOME),
+    DefaultCategory("Фриланс", "💰", CategoryType.INCOME),
+    DefaultCategory("Подарок", "🎁", CategoryType.INCOME),
+    DefaultCategory("Инвестиции", "📈", CategoryType.INCOME),
+    DefaultCategory("Другое", "✏️", CategoryType.INCOME),
+)
+
+## Все предустановленные категории
+DEFAULT_CATEGORIES: tuple[DefaultCategory, ...] = DEFAULT_EXPENSE_CATEGORIES + DEFAULT_INCOME_CATEGORIES
+
+
+## Проекция транзакции для чтения без гидрации ORM-объектов
+def _transaction_view_query() -> Select:
+    """
+    Построить Core-запрос транзакций с данными категории.
+    
+    Возвращает плоские строки (``Row``) вместо ORM-объектов: без identity map,
+    инструментации атрибутов и отдельного запроса selectinload для категорий.
+    Поля строки: id, type, amount, description, created_at, category_id,
+    category_name, category_emoji.
+    
+    :return: SELECT с JOIN на категории
+    
+    Example:
+        >>> query = _transaction_view_query().where(Transaction.user_id == 1)
+    """
+    return (
+        select(
+            Transaction.id,
+            Transaction.type,
+            Transaction.amount,
+            Transaction.description,
+            Transaction.created_at,
+            Transaction.category_id,
+            Category.name.label('category_name'),
+            Category.emoji.label('category_emoji'),
+        )
+        .join(Category, Transaction.category_id == Category.id)
+    )
+
+
+## Запрос списка категорий
+def _categories_query(
+    user_id: Optional[int],
+    category_type: Optional[CategoryType],
+    include_default: bool
+) -> Select:
+    """
+    Построить запрос категорий для ``get_categories``.
+    
+    :param user_id: ID пользователя для фильтрации (опционально)
+    :param category_type: Тип категории для фильтрации (опционально)
+    :param include_default: Включить предустановленные категории
+    :return: SELECT категорий с сортировкой
+    """
+    query = select(Category)
+    
+    conditions = []
+    
+    if include_default:
+        if user_id:
+            conditions.append(
+                or_(Category.is_default == True, Category.user_id == user_id)
+            )
+        else:
+            conditions.append(Category.is_default == True)
+    elif user_id:
+        conditions.append(Category.user_id == user_id)
+    
+    if category_type:
+        conditions.append(Category.type == category_type)
+    
+    if conditions:
+        query = query.where(and_(*conditions))
+    
+    return query.order_by(Category.is_default.desc(), Category.name)
+
+
+## Горячие запросы для прогрева кэша подготовленных выражений
+def _hot_statements() -> list[Select]:
+    """
+    Собрать самые частые запросы модуля с параметрами-заглушками.
+    
+    Текст SQL совпадает с тем, что строят сервисные функции (значения
+    параметров передаются отдельно), поэтому подготовленные выражения
+    переиспользуются при реальных вызовах. ID -1 не существует — запросы
+    возвращают пустой результат.
+    
+    :return: Список SELECT-запросов
+    """
+    sentinel_user_id = -1
+    
+    return [
+        _categories_query(sentinel_user_id, None, True),
+        _categories_query(sentinel_user_id, CategoryType.EXPENSE, True),
+        _categories_query(sentinel_user_id, CategoryType.INCOME, True),
+        _categories_query(sentinel_user_id, None, False),
+        select(func.count(Transaction.id)).where(Transaction.user_id == sentinel_user_id),
+        _transaction_view_query()
+        .where(Transaction.user_id == sentinel_user_id)
+        .order_by(Transaction.created_at.desc())
+        .limit(10)
+        .offset(0),
+    ]
+
+
+## Прогрев кэша подготовленных выражений asyncpg
+async def warm_up_statement_cache(connections: int = 10) -> None:
+    """
+    Выполнить горячие запросы на каждом соединении пула.
+    
+    asyncpg хранит подготовленные выражения отдельно для каждого соединения,
+    и первый запрос на новом соединении платит за parse/plan. Сессии
+    открываются одновременно, чтобы пул выдал ``connections`` разных
+    соединений. Для SQLite ничего не делает.
+    
+    :param connections: Количество соединений для прогрева (обычно pool_size)
+    :return: None
+    
+    Example:
+        >>> await warm_up_statement_cache(connections=10)
+    """
+    async def warm_connection() -> None:
+        async with get_session() as session:
+            if session.bind.dialect.name != "postgresql":
+                return
+            
+            for statement in _hot_statements():
+                await session.execute(statement)
+    
+    await asyncio.gather(*(warm_connection() for _ in range(connections)))
+
+
+## Сессия запроса или новая сессия
+@asynccontextmanager
+async def _session_ctx(session: Optional[AsyncSession]) -> AsyncIterator[AsyncSession]:
+    """
+    Использовать переданную сессию или открыть новую.
+    
+    Переданная сессия принадлежит вызывающему коду (например, middleware
+    запроса): она не закрывается здесь. Функции записи сами вызывают
+    ``session.commit()`` на ней, чтобы изменения фиксировались до ответа
+    пользователю. Без сессии поведение прежнее — ``get_session()`` с коммитом по выходу.
+    
+    :param session: Сессия БД запроса или None
+    :return: Асинхронная сессия SQLAlchemy
+    
+    Example:
+        >>> async with _session_ctx(None) as session:
+        ...     await session.execute(select(User))
+    """
+    if session is not None:
+        yield session
+        return
+    
+    async with get_session() as new_session:
+        yield new_session
+
+
+## Выбор INSERT с поддержкой ON CONFLICT для текущего диалекта
+def _dialect_insert(session: AsyncSession, model):
+    """
+    Получить конструктор INSERT с поддержкой ``ON CONFLICT`` для диалекта сессии.
+    
+    :param session: Асинхронная сессия БД
+    :param model: Модель SQLAlchemy
+    :return: Диалектный объект Insert (PostgreSQL или SQLite)
+    """
+    if session.bind.dialect.name == "postgresql":
+        return pg_insert(model)
+    return sqlite_insert(model)
+
+
+## Получение накопительных итогов с заполнением при отсутствии строки
+async def _ensure_running_total(session: AsyncSession, user_id: int) -> Row:
+    """
+    Прочитать накопительные итоги пользователя, заполнив их при отсутствии строки.
+    
+    Строки может не быть, если таблица создана через ``create_tables()`` на
+    существующей БД без бэкфилла миграции 002. Тогда итоги заполняются полным
+    ``SUM`` по транзакциям пользователя в той же транзакции БД
+    (``ON CONFLICT DO NOTHING`` на случай конкурентного заполнения).
+    
+    Функции записи вызывают ее до изменения транзакций в сессии, чтобы
+    ``SUM`` не включал еще не учтенную дельту. Чтение идет через Core-запрос
+    колонок, а не ``session.get``, чтобы не получить устаревший объект
+    из identity map после upsert.
+    
+    :param session: Асинхронная сессия БД
+    :param user_id: ID пользователя
+    :return: Строка (total_income, total_expense, income_count, expense_count)
+    """
+    totals_query = select(
+        UserRunningTotal.total_income,
+        UserRunningTotal.total_expense,
+        UserRunningTotal.income_count,
+        UserRunningTotal.expense_count,
+    ).where(UserRunningTotal.user_id == user_id)
+    
+    row = (await session.execute(totals_query)).first()
+    if row is not None:
+        return row
+    
+    is_income = Transaction.type == TransactionType.INCOME
+    is_expense = Transaction.type == TransactionType.EXPENSE
+    backfill = select(
+        literal(user_id),
+        func.coalesce(func.sum(case((is_income, Transaction.amount))), 0),
+        func.coalesce(func.sum(case((is_expense, Transaction.amount))), 0),
+        func.count(case((is_income, 1))),
+        func.count(case((is_expense, 1))),
+    ).where(Transaction.user_id == user_id)
+    
+    stmt = _dialect_insert(session, UserRunningTotal).from_select(
+        ['user_id', 'total_income', 'total_expense', 'income_count', 'expense_count'],
+        backfill
+    ).on_conflict_do_nothing(index_elements=[UserRunningTotal.user_id])
+    await session.execute(stmt)
+    logger.info(f"Накопительные итоги пользователя {user_id} заполнены по транзакциям")
+    
+    return (await session.execute(totals_query)).one()
+
+
+## Атомарное изменение накопительных итогов пользователя
+async def _update_running_total(
+    session: AsyncSession,
+    user_id: int,
+    transaction_type: TransactionType,
+    amount: Decimal,
+    count: int
+) -> None:
+    """
+    Изменить накопительные итоги пользователя на заданную дельту.
+    
+    Выполняет ``INSERT ... ON CONFLICT DO UPDATE`` с инкрементом на стороне БД,
+    поэтому вызов безопасен при конкурентных записях. Должна вызываться
+    в той же сессии, что и изменение транзакции, чтобы итоги коммитились атомарно,
+    и после ``_ensure_running_total`` — иначе для пользователя без строки итогов
+    сохранится только эта дельта.
+    
+    :param session: Асинхронная сессия БД
+    :param user_id: ID пользователя
+    :param transaction_type: Тип транзакции, итог которого меняется
+    :param amount: Дельта суммы (отрицательная при удалении)
+    :param count: Дельта количества транзакций (+1 / -1)
+    :return: None
+    """
+    if transaction_type == TransactionType.INCOME:
+        total_column, count_column = "total_income", "income_count"
+    else:
+        total_column, count_column = "total_expense", "expense_count"
+    
+    stmt = _dialect_insert(session, UserRunningTotal).values(
+        user_id=user_id,
+        **{total_column: amount, count_column: count}
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UserRunningTotal.user_id],
+        set_={
+            total_column: getattr(UserRunningTotal, total_column) + getattr(stmt.excluded, total_column),
+            count_column: getattr(UserRunningTotal, count_column) + getattr(stmt.excluded, count_column),
+        }
+    )
+    await session.execute(stmt)
 
 
 async def initialize_default_categories() -> None:
@@ -65,37 +344,32 @@ async def initialize_default_categories() -> None:
     async with base.async_session_maker() as session:
         try:
             existing_defaults = await session.execute(
-                select(Category).where(Category.is_default == True)
+                select(Category.id).where(Category.is_default == True).limit(1)
             )
             
-            if existing_defaults.scalars().first():
+            if existing_defaults.first():
                 logger.info("Предустановленные категории уже существуют")
                 return
             
             logger.info("Создаю предустановленные категории...")
             
-            for cat_data in DEFAULT_EXPENSE_CATEGORIES:
-                category = Category(
-                    name=cat_data["name"],
-                    emoji=cat_data["emoji"],
-                    type=CategoryType.EXPENSE.value,
-                    is_default=True,
-                    user_id=None
-                )
-                session.add(category)
-            
-            for cat_data in DEFAULT_INCOME_CATEGORIES:
-                category = Category(
-                    name=cat_data["name"],
-                    emoji=cat_data["emoji"],
-                    type=CategoryType.INCOME.value,
-                    is_default=True,
-                    user_id=None
-                )
-                session.add(category)
+            ## Один INSERT на все категории (executemany) вместо session.add по одной
+            await session.execute(
+                insert(Category),
+                [
+                    {
+                        "name": default.name,
+                        "emoji": default.emoji,
+                        "type": default.type,
+                        "is_default": True,
+                        "user_id": None,
+                    }
+                    for default in DEFAULT_CATEGORIES
+                ]
+            )
             
             await session.commit()
-            logger.success(f"✅ Создано {len(DEFAULT_EXPENSE_CATEGORIES) + len(DEFAULT_INCOME_CATEGORIES)} предустановленных категорий")
+            logger.success(f"✅ Создано {len(DEFAULT_CATEGORIES)} предустановленных категорий")
         except Exception:
             await session.rollback()
             raise
@@ -105,18 +379,22 @@ async def get_or_create_user(
     telegram_id: int,
     username: Optional[str] = None,
     first_name: str = "",
-    last_name: Optional[str] = None
+    last_name: Optional[str] = None,
+    session: Optional[AsyncSession] = None
 ) -> User:
     """
     Получить существующего пользователя или создать нового.
     
-    Ищет пользователя по telegram_id. Если пользователь не найден,
-    создает новую запись в БД.
+    Обычный случай (пользователь есть, данные не менялись) — один ``SELECT``
+    без записи. Только при отсутствии пользователя или изменении полей
+    выполняется ``INSERT ... ON CONFLICT DO UPDATE ... RETURNING``: он безопасен
+    при гонке двух первых сообщений и всегда возвращает строку.
     
     :param telegram_id: ID пользователя в Telegram
     :param username: Username пользователя в Telegram (опционально)
     :param first_name: Имя пользователя
     :param last_name: Фамилия пользователя (опционально)
+    :param session: Сессия БД запроса (если не передана, открывается новая)
     :return: Объект пользователя
     
     Example:
@@ -126,32 +404,44 @@ async def get_or_create_user(
         ...     first_name="John"
         ... )
     """
-    async with get_session() as session:
+    async with _session_ctx(session) as session:
         result = await session.execute(
             select(User).where(User.telegram_id == telegram_id)
         )
         user = result.scalar_one_or_none()
         
-        if user:
-            if username and user.username != username:
-                user.username = username
-            if first_name and user.first_name != first_name:
-                user.first_name = first_name
-            if last_name and user.last_name != last_name:
-                user.last_name = last_name
-            await session.commit()
-            logger.debug(f"Пользователь обновлен: {telegram_id}")
-        else:
-            user = User(
-                telegram_id=telegram_id,
-                username=username,
-                first_name=first_name or "Пользователь",
-                last_name=last_name
-            )
-            session.add(user)
-            await session.commit()
-            await session.refresh(user)
-            logger.info(f"✅ Создан новый пользователь: {telegram_id}")
+        ## Обновляем только переданные и реально изменившиеся поля
+        update_values = {
+            key: value
+            for key, value in (("username", username), ("first_name", first_name), ("last_name", last_name))
+            if value and (user is None or getattr(user, key) != value)
+        }
+        
+        if user is not None and not update_values:
+            return user
+        
+        stmt = _dialect_insert(session, User).values(
+            telegram_id=telegram_id,
+            username=username,
+            first_name=first_name or "Пользователь",
+            last_name=last_name
+        )
+        
+        ## DO UPDATE без условия: RETURNING возвращает строку и при конфликте
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[User.telegram_id],
+            set_={
+                **{key: getattr(stmt.excluded, key) for key in update_values},
+                "updated_at": func.now() if update_values else User.updated_at
+            }
+        )
+        
+        result = await session.execute(
+            stmt.returning(User),
+            execution_options={"populate_existing": True}
+        )
+        user = result.scalar_one()
+        logger.debug(f"Пользователь создан или обновлен: {telegram_id}")
         
         return user
 
@@ -159,7 +449,8 @@ async def get_or_create_user(
 async def get_categories(
     user_id: Optional[int] = None,
     category_type: Optional[CategoryType] = None,
-    include_default: bool = True
+    include_default: bool = True,
+    session: Optional[AsyncSession] = None
 ) -> list[Category]:
     """
     Получить список категорий.
@@ -170,6 +461,7 @@ async def get_categories(
     :param user_id: ID пользователя для фильтрации (опционально)
     :param category_type: Тип категории для фильтрации (опционально)
     :param include_default: Включить предустановленные категории
+    :param session: Сессия БД запроса (если не передана, открывается новая)
     :return: Список категорий
     
     Example:
@@ -179,46 +471,30 @@ async def get_categories(
         ...     include_default=True
         ... )
     """
-    async with get_session() as session:
-        query = select(Category)
-        
-        conditions = []
-        
-        if include_default:
-            if user_id:
-                from sqlalchemy import or_
-                conditions.append(
-                    or_(Category.is_default == True, Category.user_id == user_id)
-                )
-            else:
-                conditions.append(Category.is_default == True)
-        elif user_id:
-            conditions.append(Category.user_id == user_id)
-        
-        if category_type:
-            conditions.append(Category.type == category_type)
-        
-        if conditions:
-            from sqlalchemy import and_
-            query = query.where(and_(*conditions))
-        
-        result = await session.execute(query.order_by(Category.is_default.desc(), Category.name))
-        return list(result.scalars().all())
+    async with _session_ctx(session) as session:
+        result = await session.execute(
+            _categories_query(user_id, category_type, include_default)
+        )
+        return result.scalars().all()
 
 
 ## Получение категории по ID
-async def get_category_by_id(category_id: int) -> Optional[Category]:
+async def get_category_by_id(
+    category_id: int,
+    session: Optional[AsyncSession] = None
+) -> Optional[Category]:
     """
     Получить категорию по ID.
     
     :param category_id: ID категории
+    :param session: Сессия БД запроса (если не передана, открывается новая)
     :return: Объект категории или None если не найдена
     
     Example:
         >>> category = await get_category_by_id(1)
         >>> print(category.name)
     """
-    async with get_session() as session:
+    async with _session_ctx(session) as session:
         result = await session.execute(
             select(Category).where(Category.id == category_id)
         )
@@ -230,7 +506,8 @@ async def create_custom_category(
     user_id: int,
     name: str,
     category_type: CategoryType,
-    emoji: str = "✏️"
+    emoji: str = "✏️",
+    session: Optional[AsyncSession] = None
 ) -> Category:
     """
     Создать пользовательскую категорию.
@@ -239,6 +516,7 @@ async def create_custom_category(
     :param name: Название категории
     :param category_type: Тип категории
     :param emoji: Эмодзи для категории
+    :param session: Сессия БД запроса (если не передана, открывается новая)
     :return: Созданная категория
     
     Example:
@@ -249,17 +527,16 @@ async def create_custom_category(
         ...     emoji="📱"
         ... )
     """
-    async with get_session() as session:
+    async with _session_ctx(session) as session:
         category = Category(
             name=name,
             emoji=emoji,
-            type=category_type.value if hasattr(category_type, 'value') else category_type,
+            type=CategoryType(category_type),
             is_default=False,
             user_id=user_id
         )
         session.add(category)
         await session.commit()
-        await session.refresh(category)
         
         logger.info(f"✅ Создана пользовательская категория: {name} для пользователя {user_id}")
         
@@ -270,6 +547,7 @@ async def create_custom_category(
 async def update_category(
     category_id: int,
     user_id: int,
+    session: Optional[AsyncSession] = None,
     **kwargs
 ) -> Optional[Category]:
     """
@@ -278,6 +556,7 @@ async def update_category(
     :param category_id: ID категории
     :param user_id: ID пользователя (для проверки прав)
     :param kwargs: Поля для обновления (name, emoji)
+    :param session: Сессия БД запроса (если не передана, открывается новая)
     :return: Обновленная категория или None
     
     Example:
@@ -288,7 +567,7 @@ async def update_category(
         ...     emoji="🎯"
         ... )
     """
-    async with get_session() as session:
+    async with _session_ctx(session) as session:
         result = await session.execute(
             select(Category).where(
                 Category.id == category_id,
@@ -307,7 +586,6 @@ async def update_category(
                 setattr(category, key, value)
         
         await session.commit()
-        await session.refresh(category)
         
         logger.info(f"✏️ Обновлена категория {category_id} пользователя {user_id}")
         
@@ -315,7 +593,11 @@ async def update_category(
 
 
 ## Удаление категории
-async def delete_category(category_id: int, user_id: int) -> bool:
+async def delete_category(
+    category_id: int,
+    user_id: int,
+    session: Optional[AsyncSession] = None
+) -> bool:
     """
     Удалить пользовательскую категорию.
     
@@ -323,12 +605,13 @@ async def delete_category(category_id: int, user_id: int) -> bool:
     
     :param category_id: ID категории
     :param user_id: ID пользователя (для проверки прав)
+    :param session: Сессия БД запроса (если не передана, открывается новая)
     :return: True если удаление успешно, False если категория не найдена
     
     Example:
         >>> success = await delete_category(category_id=10, user_id=1)
     """
-    async with get_session() as session:
+    async with _session_ctx(session) as session:
         result = await session.execute(
             select(Category).where(
                 Category.id == category_id,
@@ -342,6 +625,21 @@ async def delete_category(category_id: int, user_id: int) -> bool:
             logger.warning(f"Категория {category_id} не найдена или не может быть удалена")
             return False
         
+        await _ensure_running_total(session, user_id)
+        
+        ## Транзакции категории удаляются каскадом - вычитаем их из итогов
+        totals = await session.execute(
+            select(
+                Transaction.type,
+                func.sum(Transaction.amount).label('total'),
+                func.count(Transaction.id).label('count')
+            )
+            .where(Transaction.category_id == category_id)
+            .group_by(Transaction.type)
+        )
+        for row in totals.all():
+            await _update_running_total(session, user_id, row.type, -row.total, -row.count)
+        
         await session.delete(category)
         await session.commit()
         
@@ -351,18 +649,23 @@ async def delete_category(category_id: int, user_id: int) -> bool:
 
 
 ## Подсчет транзакций в категории
-async def count_category_transactions(category_id: int, user_id: int) -> int:
+async def count_category_transactions(
+    category_id: int,
+    user_id: int,
+    session: Optional[AsyncSession] = None
+) -> int:
     """
     Подсчитать количество транзакций в категории.
     
     :param category_id: ID категории
     :param user_id: ID пользователя
+    :param session: Сессия БД запроса (если не передана, открывается новая)
     :return: Количество транзакций
     
     Example:
         >>> count = await count_category_transactions(category_id=10, user_id=1)
     """
-    async with get_session() as session:
+    async with _session_ctx(session) as session:
         result = await session.execute(
             select(func.count(Transaction.id)).where(
                 Transaction.category_id == category_id,
@@ -377,7 +680,8 @@ async def create_transaction(
     transaction_type: TransactionType,
     amount: Decimal,
     category_id: int,
-    description: Optional[str] = None
+    description: Optional[str] = None,
+    session: Optional[AsyncSession] = None
 ) -> Transaction:
     """
     Создать новую транзакцию.
@@ -389,6 +693,7 @@ async def create_transaction(
     :param amount: Сумма транзакции (Decimal для точности)
     :param category_id: ID категории
     :param description: Описание транзакции (опционально)
+    :param session: Сессия БД запроса (если не передана, открывается новая)
     :return: Созданная транзакция
     
     Example:
@@ -400,17 +705,22 @@ async def create_transaction(
         ...     description="Покупка продуктов"
         ... )
     """
-    async with get_session() as session:
+    transaction_type = TransactionType(transaction_type)
+    
+    async with _session_ctx(session) as session:
+        ## Заполняем итоги до добавления транзакции, чтобы SUM ее не учел
+        await _ensure_running_total(session, user_id)
+        
         transaction = Transaction(
             user_id=user_id,
-            type=transaction_type.value if hasattr(transaction_type, 'value') else transaction_type,
+            type=transaction_type,
             amount=amount,
             category_id=category_id,
             description=description
         )
         session.add(transaction)
+        await _update_running_total(session, user_id, transaction_type, amount, 1)
         await session.commit()
-        await session.refresh(transaction)
         
         logger.info(f"✅ Создана транзакция: {transaction_type.value} {amount}₽ для пользователя {user_id}")
         
@@ -421,19 +731,22 @@ async def get_user_transactions(
     user_id: int,
     transaction_type: Optional[TransactionType] = None,
     limit: int = 10,
-    offset: int = 0
-) -> list[Transaction]:
+    offset: int = 0,
+    session: Optional[AsyncSession] = None
+) -> list[Row]:
     """
     Получить список транзакций пользователя.
     
     Возвращает транзакции с пагинацией и опциональной фильтрацией по типу.
-    Использует eager loading для связанных категорий.
+    Строки содержат поля транзакции и category_name/category_emoji
+    (см. ``_transaction_view_query``).
     
     :param user_id: ID пользователя
     :param transaction_type: Фильтр по типу транзакции (опционально)
     :param limit: Количество записей для возврата
     :param offset: Смещение для пагинации
-    :return: Список транзакций
+    :param session: Сессия БД запроса (если не передана, открывается новая)
+    :return: Список строк транзакций
     
     Example:
         >>> transactions = await get_user_transactions(
@@ -442,12 +755,8 @@ async def get_user_transactions(
         ...     limit=10
         ... )
     """
-    async with get_session() as session:
-        query = (
-            select(Transaction)
-            .options(selectinload(Transaction.category))
-            .where(Transaction.user_id == user_id)
-        )
+    async with _session_ctx(session) as session:
+        query = _transaction_view_query().where(Transaction.user_id == user_id)
         
         if transaction_type:
             query = query.where(Transaction.type == transaction_type)
@@ -455,10 +764,14 @@ async def get_user_transactions(
         query = query.order_by(Transaction.created_at.desc()).limit(limit).offset(offset)
         
         result = await session.execute(query)
-        return list(result.scalars().all())
+        return result.all()
 
 
-async def delete_transaction(transaction_id: int, user_id: int) -> bool:
+async def delete_transaction(
+    transaction_id: int,
+    user_id: int,
+    session: Optional[AsyncSession] = None
+) -> bool:
     """
     Удалить транзакцию.
     
@@ -466,12 +779,13 @@ async def delete_transaction(transaction_id: int, user_id: int) -> bool:
     
     :param transaction_id: ID транзакции
     :param user_id: ID пользователя (для проверки прав)
+    :param session: Сессия БД запроса (если не передана, открывается новая)
     :return: True если удаление успешно, False если транзакция не найдена
     
     Example:
         >>> success = await delete_transaction(transaction_id=123, user_id=1)
     """
-    async with get_session() as session:
+    async with _session_ctx(session) as session:
         result = await session.execute(
             select(Transaction).where(
                 Transaction.id == transaction_id,
@@ -483,6 +797,8 @@ async def delete_transaction(transaction_id: int, user_id: int) -> bool:
         if not transaction:
             return False
         
+        await _ensure_running_total(session, user_id)
+        await _update_running_total(session, user_id, transaction.type, -transaction.amount, -1)
         await session.delete(transaction)
         await session.commit()
         
@@ -492,23 +808,29 @@ async def delete_transaction(transaction_id: int, user_id: int) -> bool:
 
 
 ## Получение транзакции по ID
-async def get_transaction_by_id(transaction_id: int, user_id: int) -> Optional[Transaction]:
+async def get_transaction_by_id(
+    transaction_id: int,
+    user_id: int,
+    session: Optional[AsyncSession] = None
+) -> Optional[Transaction]:
     """
     Получить транзакцию по ID с проверкой прав доступа.
     
     :param transaction_id: ID транзакции
     :param user_id: ID пользователя (для проверки прав)
+    :param session: Сессия БД запроса (если не передана, открывается новая)
     :return: Объект транзакции или None
     
     Example:
         >>> transaction = await get_transaction_by_id(transaction_id=123, user_id=1)
     """
-    async with get_session() as session:
+    async with _session_ctx(session) as session:
         result = await session.execute(
             select(Transaction)
             .options(
-                # Загружаем связанную категорию
-                selectinload(Transaction.category)
+                # Загружаем связанную категорию, остальные ленивые загрузки запрещены
+                selectinload(Transaction.category).raiseload("*"),
+                raiseload("*")
             )
             .where(
                 Transaction.id == transaction_id,
@@ -523,7 +845,8 @@ async def count_user_transactions(
     user_id: int,
     transaction_type: Optional[TransactionType] = None,
     start_date: Optional[datetime] = None,
-    end_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None,
+    session: Optional[AsyncSession] = None
 ) -> int:
     """
     Подсчитать количество транзакций пользователя.
@@ -532,12 +855,13 @@ async def count_user_transactions(
     :param transaction_type: Фильтр по типу транзакции
     :param start_date: Начало периода
     :param end_date: Конец периода
+    :param session: Сессия БД запроса (если не передана, открывается новая)
     :return: Количество транзакций
     
     Example:
         >>> count = await count_user_transactions(user_id=1, transaction_type=TransactionType.EXPENSE)
     """
-    async with get_session() as session:
+    async with _session_ctx(session) as session:
         query = select(func.count(Transaction.id)).where(Transaction.user_id == user_id)
         
         if transaction_type:
@@ -553,6 +877,50 @@ async def count_user_transactions(
         return result.scalar() or 0
 
 
+## Подсчет транзакций по типам одним запросом
+async def count_user_transactions_by_type(
+    user_id: int,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    session: Optional[AsyncSession] = None
+) -> dict[TransactionType, int]:
+    """
+    Подсчитать доходы и расходы пользователя за один проход.
+    
+    Использует ``COUNT(*) FILTER (WHERE ...)`` вместо двух вызовов
+    ``count_user_transactions`` с разным типом.
+    
+    :param user_id: ID пользователя
+    :param start_date: Начало периода
+    :param end_date: Конец периода
+    :param session: Сессия БД запроса (если не передана, открывается новая)
+    :return: Словарь {TransactionType: количество}
+    
+    Example:
+        >>> counts = await count_user_transactions_by_type(user_id=1)
+        >>> print(counts[TransactionType.INCOME], counts[TransactionType.EXPENSE])
+    """
+    async with _session_ctx(session) as session:
+        query = select(
+            func.count().filter(Transaction.type == TransactionType.INCOME).label('income'),
+            func.count().filter(Transaction.type == TransactionType.EXPENSE).label('expense')
+        ).where(Transaction.user_id == user_id)
+        
+        if start_date:
+            query = query.where(Transaction.created_at >= start_date)
+        
+        if end_date:
+            query = query.where(Transaction.created_at <= end_date)
+        
+        result = await session.execute(query)
+        row = result.one()
+        
+        return {
+            TransactionType.INCOME: row.income,
+            TransactionType.EXPENSE: row.expense,
+        }
+
+
 ## Получение транзакций с фильтрацией по периоду
 async def get_user_transactions_with_filters(
     user_id: int,
@@ -560,18 +928,23 @@ async def get_user_transactions_with_filters(
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
     limit: int = 10,
-    offset: int = 0
-) -> list[Transaction]:
+    offset: int = 0,
+    session: Optional[AsyncSession] = None
+) -> list[Row]:
     """
     Получить транзакции с фильтрацией по периоду.
     
+    Строки содержат поля транзакции и category_name/category_emoji
+    (см. ``_transaction_view_query``).
+    
     :param user_id: ID пользователя
     :param transaction_type: Фильтр по типу транзакции
     :param start_date: Начало периода
     :param end_date: Конец периода
     :param limit: Количество записей
     :param offset: Смещение для пагинации
-    :return: Список транзакций
+    :param session: Сессия БД запроса (если не передана, открывается новая)
+    :return: Список строк транзакций
     
     Example:
         >>> from datetime import datetime, timedelta
@@ -583,12 +956,8 @@ async def get_user_transactions_with_filters(
         ...     end_date=end
         ... )
     """
-    async with get_session() as session:
-        query = (
-            select(Transaction)
-            .options(selectinload(Transaction.category))
-            .where(Transaction.user_id == user_id)
-        )
+    async with _session_ctx(session) as session:
+        query = _transaction_view_query().where(Transaction.user_id == user_id)
         
         if transaction_type:
             query = query.where(Transaction.type == transaction_type)
@@ -602,28 +971,265 @@ async def get_user_transactions_with_filters(
         query = query.order_by(Transaction.created_at.desc()).limit(limit).offset(offset)
         
         result = await session.execute(query)
-        return list(result.scalars().all())
+        return result.all()
+
+
+## Запрос транзакций для экспорта (только нужные колонки)
+def _export_query(
+    user_id: int,
+    start_date: Optional[datetime],
+    end_date: Optional[datetime]
+) -> Select:
+    """
+    Построить запрос строк экспорта в порядке колонок отчета.
+    
+    Колонки: (created_at, type, amount, category_emoji, category_name, description).
+    Сумма приходит сразу числом с плавающей точкой и со знаком (расходы
+    отрицательные): преобразование делает БД для всей выборки, без
+    ``Decimal`` и ветвления по типу на каждой строке отчета.
+    
+    :param user_id: ID пользователя
+    :param start_date: Начало периода
+    :param end_date: Конец периода
+    :return: SELECT с JOIN на категории
+    """
+    query = (
+        select(
+            Transaction.created_at,
+            Transaction.type,
+            cast(
+                case(
+                    (Transaction.type == TransactionType.EXPENSE, -Transaction.amount),
+                    else_=Transaction.amount
+                ),
+                Float
+            ).label("amount"),
+            Category.emoji,
+            Category.name,
+            Transaction.description,
+        )
+        .join(Category, Transaction.category_id == Category.id)
+        .where(Transaction.user_id == user_id)
+    )
+    
+    if start_date:
+        query = query.where(Transaction.created_at >= start_date)
+    
+    if end_date:
+        query = query.where(Transaction.created_at <= end_date)
+    
+    return query.order_by(Transaction.created_at.desc())
+
+
+## Потоковое чтение транзакций для экспорта
+async def iter_user_transactions_for_export(
+    user_id: int,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    batch_size: int = 1000,
+    session: Optional[AsyncSession] = None
+) -> AsyncIterator[Row]:
+    """
+    Итерировать строки экспорта через серверный курсор.
+    
+    Строки приходят пачками по ``batch_size`` и сразу уходят в файл,
+    поэтому память не растет с количеством транзакций.
+    
+    :param user_id: ID пользователя
+    :param start_date: Начало периода
+    :param end_date: Конец периода
+    :param batch_size: Размер пачки строк, получаемых из БД
+    :param session: Сессия БД запроса (если не передана, открывается новая)
+    :return: Асинхронный итератор строк-кортежей (см. ``_export_query``)
+    
+    Example:
+        >>> async for created_at, tr_type, amount, emoji, name, description in (
+        ...     iter_user_transactions_for_export(user_id=1)
+        ... ):
+        ...     print(created_at, amount)
+    """
+    async with _session_ctx(session) as session:
+        query = _export_query(user_id, start_date, end_date).execution_options(
+            yield_per=batch_size
+        )
+        
+        result = await session.stream(query)
+        async for row in result:
+            yield row
+
+
+## Статистика и строки экспорта в одной сессии
+@asynccontextmanager
+async def get_user_export_bundle(
+    user_id: int,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    batch_size: int = 1000
+) -> AsyncIterator[tuple[dict, AsyncIterator[Row]]]:
+    """
+    Открыть одну сессию для экспорта: статистика и поток строк.
+    
+    Агрегаты и строки читаются через одно соединение и одну транзакцию,
+    а не через два независимых подключения из пула. Итератор строк
+    действителен только внутри блока ``async with``.
+    
+    :param user_id: ID пользователя
+    :param start_date: Начало периода
+    :param end_date: Конец периода
+    :param batch_size: Размер пачки строк, получаемых из БД
+    :return: Кортеж (статистика как в get_user_statistics, итератор строк экспорта)
+    
+    Example:
+        >>> async with get_user_export_bundle(user_id=1) as (stats, rows):
+        ...     async for created_at, tr_type, amount, emoji, name, description in rows:
+        ...         print(created_at, amount)
+    """
+    async with get_session() as session:
+        stats = await get_user_statistics(user_id, start_date, end_date, session=session)
+        rows = iter_user_transactions_for_export(
+            user_id, start_date, end_date, batch_size, session=session
+        )
+        yield stats, rows
+
+
+## Отпечаток данных экспорта
+async def get_export_fingerprint(
+    user_id: int,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    session: Optional[AsyncSession] = None
+) -> tuple:
+    """
+    Получить отпечаток набора строк экспорта одним агрегатным запросом.
+    
+    Отпечаток меняется при добавлении (растет максимальный id), удалении
+    (меняется количество) и изменении (растет updated_at) транзакций периода,
+    а также при изменении их категорий.
+    
+    :param user_id: ID пользователя
+    :param start_date: Начало периода
+    :param end_date: Конец периода
+    :param session: Сессия БД запроса (если не передана, открывается новая)
+    :return: Кортеж (количество, максимальный id, последние updated_at транзакций и категорий)
+    
+    Example:
+        >>> fingerprint = await get_export_fingerprint(user_id=1)
+        >>> print(fingerprint)
+        (42, 1337, datetime(...), datetime(...))
+    """
+    query = (
+        select(
+            func.count(Transaction.id),
+            func.max(Transaction.id),
+            func.max(Transaction.updated_at),
+            func.max(Category.updated_at),
+        )
+        .join(Category, Transaction.category_id == Category.id)
+        .where(Transaction.user_id == user_id)
+    )
+    
+    if start_date:
+        query = query.where(Transaction.created_at >= start_date)
+    
+    if end_date:
+        query = query.where(Transaction.created_at <= end_date)
+    
+    async with _session_ctx(session) as session:
+        result = await session.execute(query)
+        return tuple(result.one())
+
+
+## Потоковое чтение транзакций без материализации списка
+async def iter_user_transactions(
+    user_id: int,
+    transaction_type: Optional[TransactionType] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    batch_size: int = 500,
+    session: Optional[AsyncSession] = None
+) -> AsyncIterator[Row]:
+    """
+    Итерировать транзакции пользователя через серверный курсор.
+    
+    В отличие от ``get_user_transactions_with_filters`` не загружает весь
+    результат в память: строки приходят пачками по ``batch_size``.
+    Формат строк тот же (см. ``_transaction_view_query``).
+    
+    :param user_id: ID пользователя
+    :param transaction_type: Фильтр по типу транзакции
+    :param start_date: Начало периода
+    :param end_date: Конец периода
+    :param batch_size: Размер пачки строк, получаемых из БД
+    :param session: Сессия БД запроса (если не передана, открывается новая)
+    :return: Асинхронный итератор строк транзакций
+    
+    Example:
+        >>> async for tr in iter_user_transactions(user_id=1):
+        ...     print(tr.amount, tr.category_name)
+    """
+    async with _session_ctx(session) as session:
+        query = _transaction_view_query().where(Transaction.user_id == user_id)
+        
+        if transaction_type:
+            query = query.where(Transaction.type == transaction_type)
+        
+        if start_date:
+            query = query.where(Transaction.created_at >= start_date)
+        
+        if end_date:
+            query = query.where(Transaction.created_at <= end_date)
+        
+        query = query.order_by(Transaction.created_at.desc()).execution_options(
+            yield_per=batch_size
+        )
+        
+        result = await session.stream(query)
+        async for row in result:
+            yield row
 
 
 ## Получение статистики пользователя
 async def get_user_statistics(
     user_id: int,
     start_date: Optional[datetime] = None,
-    end_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None,
+    session: Optional[AsyncSession] = None
 ) -> dict:
     """
     Получить статистику доходов и расходов пользователя.
     
+    Без указания периода использует накопительные итоги (O(1)),
+    для периода выполняет агрегацию по транзакциям.
+    
     :param user_id: ID пользователя
     :param start_date: Начало периода
     :param end_date: Конец периода
+    :param session: Сессия БД запроса (если не передана, открывается новая)
     :return: Словарь со статистикой
     
     Example:
         >>> stats = await get_user_statistics(user_id=1)
         >>> print(stats['total_income'])
     """
-    async with get_session() as session:
+    stats = {
+        'total_income': Decimal('0'),
+        'total_expense': Decimal('0'),
+        'income_count': 0,
+        'expense_count': 0,
+        'balance': Decimal('0'),
+    }
+    
+    async with _session_ctx(session) as session:
+        ## Без периода читаем накопительные итоги одной строкой (заполняются при первом обращении)
+        if not start_date and not end_date:
+            running_total = await _ensure_running_total(session, user_id)
+            stats['total_income'] = running_total.total_income
+            stats['total_expense'] = running_total.total_expense
+            stats['income_count'] = running_total.income_count
+            stats['expense_count'] = running_total.expense_count
+            stats['balance'] = running_total.total_income - running_total.total_expense
+            return stats
+        
         # Базовый запрос
         query = select(
             Transaction.type,
@@ -642,19 +1248,11 @@ async def get_user_statistics(
         result = await session.execute(query)
         rows = result.all()
         
-        stats = {
-            'total_income': Decimal('0'),
-            'total_expense': Decimal('0'),
-            'income_count': 0,
-            'expense_count': 0,
-            'balance': Decimal('0'),
-        }
-        
         for row in rows:
-            if row.type == TransactionType.INCOME.value:
+            if row.type is TransactionType.INCOME:
                 stats['total_income'] = row.total or Decimal('0')
                 stats['income_count'] = row.count
-            elif row.type == TransactionType.EXPENSE.value:
+            elif row.type is TransactionType.EXPENSE:
                 stats['total_expense'] = row.total or Decimal('0')
                 stats['expense_count'] = row.count
         
@@ -668,7 +1266,8 @@ async def get_top_expense_categories(
     user_id: int,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-    limit: int = 3
+    limit: int = 3,
+    session: Optional[AsyncSession] = None
 ) -> list[dict]:
     """
     Получить топ категорий расходов пользователя.
@@ -677,6 +1276,7 @@ async def get_top_expense_categories(
     :param start_date: Начало периода
     :param end_date: Конец периода
     :param limit: Количество категорий
+    :param session: Сессия БД запроса (если не передана, открывается новая)
     :return: Список словарей с данными категорий
     
     Example:
@@ -684,7 +1284,7 @@ async def get_top_expense_categories(
         >>> for cat in top_categories:
         ...     print(f"{cat['name']}: {cat['total']} руб.")
     """
-    async with get_session() as session:
+    async with _session_ctx(session) as session:
         query = (
             select(
                 Category.name,
@@ -696,7 +1296,7 @@ async def get_top_expense_categories(
             .where(
                 and_(
                     Transaction.user_id == user_id,
-                    Transaction.type == TransactionType.EXPENSE.value
+                    Transaction.type == TransactionType.EXPENSE
                 )
             )
         )
@@ -714,23 +1314,125 @@ async def get_top_expense_categories(
         )
         
         result = await session.execute(query)
-        rows = result.all()
+        return [dict(row) for row in result.mappings()]
+
+
+## Статистика и топ категорий расходов за один запрос
+async def get_statistics_with_top_categories(
+    user_id: int,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    limit: int = 3,
+    session: Optional[AsyncSession] = None
+) -> tuple[dict, list[dict]]:
+    """
+    Получить статистику и топ категорий расходов одним запросом.
+    
+    Транзакции периода отбираются один раз в CTE, затем агрегаты по типу
+    и топ категорий объединяются через UNION ALL. Строки разбираются
+    по колонке ``kind`` ('stats' или 'top').
+    
+    :param user_id: ID пользователя
+    :param start_date: Начало периода
+    :param end_date: Конец периода
+    :param limit: Количество категорий в топе
+    :param session: Сессия БД запроса (если не передана, открывается новая)
+    :return: Кортеж (статистика как в get_user_statistics, топ как в get_top_expense_categories)
+    
+    Example:
+        >>> stats, top_categories = await get_statistics_with_top_categories(user_id=1)
+        >>> print(stats['balance'], len(top_categories))
+    """
+    stats = {
+        'total_income': Decimal('0'),
+        'total_expense': Decimal('0'),
+        'income_count': 0,
+        'expense_count': 0,
+        'balance': Decimal('0'),
+    }
+    top_categories = []
+    
+    filtered_query = select(
+        Transaction.type,
+        Transaction.amount,
+        Transaction.category_id
+    ).where(Transaction.user_id == user_id)
+    
+    if start_date:
+        filtered_query = filtered_query.where(Transaction.created_at >= start_date)
+    
+    if end_date:
+        filtered_query = filtered_query.where(Transaction.created_at <= end_date)
+    
+    filtered = filtered_query.cte('filtered')
+    
+    stats_query = (
+        select(
+            literal('stats').label('kind'),
+            filtered.c.type,
+            null().cast(String).label('name'),
+            null().cast(String).label('emoji'),
+            func.sum(filtered.c.amount).label('total'),
+            func.count().label('count')
+        )
+        .group_by(filtered.c.type)
+    )
+    
+    ## ORDER BY + LIMIT внутри UNION допустим только в подзапросе
+    top = (
+        select(
+            Category.name,
+            Category.emoji,
+            func.sum(filtered.c.amount).label('total'),
+            func.count().label('count')
+        )
+        .join(Category, filtered.c.category_id == Category.id)
+        .where(filtered.c.type == TransactionType.EXPENSE)
+        .group_by(Category.id, Category.name, Category.emoji)
+        .order_by(func.sum(filtered.c.amount).desc())
+        .limit(limit)
+        .subquery('top')
+    )
+    
+    top_query = select(
+        literal('top').label('kind'),
+        null().cast(filtered.c.type.type).label('type'),
+        top.c.name,
+        top.c.emoji,
+        top.c.total,
+        top.c.count
+    )
+    
+    async with _session_ctx(session) as session:
+        result = await session.execute(union_all(stats_query, top_query))
         
-        return [
-            {
-                'name': row.name,
-                'emoji': row.emoji,
-                'total': row.total,
-                'count': row.count
-            }
-            for row in rows
-        ]
+        for row in result.mappings():
+            if row['kind'] == 'top':
+                top_categories.append({
+                    'name': row['name'],
+                    'emoji': row['emoji'],
+                    'total': row['total'],
+                    'count': row['count']
+                })
+            elif row['type'] == TransactionType.INCOME:
+                stats['total_income'] = row['total'] or Decimal('0')
+                stats['income_count'] = row['count']
+            elif row['type'] == TransactionType.EXPENSE:
+                stats['total_expense'] = row['total'] or Decimal('0')
+                stats['expense_count'] = row['count']
+    
+    ## UNION не гарантирует порядок строк между частями
+    top_categories.sort(key=lambda category: category['total'], reverse=True)
+    stats['balance'] = stats['total_income'] - stats['total_expense']
+    
+    return stats, top_categories
 
 
 ## Обновление транзакции
 async def update_transaction(
     transaction_id: int,
     user_id: int,
+    session: Optional[AsyncSession] = None,
     **kwargs
 ) -> Optional[Transaction]:
     """
@@ -739,7 +1441,8 @@ async def update_transaction(
     :param transaction_id: ID транзакции
     :param user_id: ID пользователя (для проверки прав)
     :param kwargs: Поля для обновления (amount as Decimal, category_id, description)
-    :return: Обновленная транзакция или None
+    :param session: Сессия БД запроса (если не передана, открывается новая)
+    :return: Обновленная транзакция (с загруженной категорией) или None
     
     Example:
         >>> transaction = await update_transaction(
@@ -749,9 +1452,14 @@ async def update_transaction(
         ...     description="Обновленное описание"
         ... )
     """
-    async with get_session() as session:
+    async with _session_ctx(session) as session:
         result = await session.execute(
-            select(Transaction).where(
+            select(Transaction)
+            .options(
+                selectinload(Transaction.category).raiseload("*"),
+                raiseload("*")
+            )
+            .where(
                 Transaction.id == transaction_id,
                 Transaction.user_id == user_id
             )
@@ -761,12 +1469,26 @@ async def update_transaction(
         if not transaction:
             return None
         
+        ## Заполняем итоги до изменения полей (иначе autoflush попадет в SUM)
+        await _ensure_running_total(session, user_id)
+        
+        old_type, old_amount = transaction.type, transaction.amount
+        
         for key, value in kwargs.items():
             if hasattr(transaction, key):
                 setattr(transaction, key, value)
         
+        ## Смена category_id не обновляет загруженную связь — подгружаем явно
+        if 'category_id' in kwargs:
+            transaction.category = await session.get(
+                Category, transaction.category_id, options=[raiseload("*")]
+            )
+        
+        if transaction.type != old_type or transaction.amount != old_amount:
+            await _update_running_total(session, user_id, old_type, -old_amount, -1)
+            await _update_running_total(session, user_id, transaction.type, transaction.amount, 1)
+        
         await session.commit()
-        await session.refresh(transaction)
         
         logger.info(f"✏️ Обновлена транзакция {transaction_id} пользователя {user_id}")
         
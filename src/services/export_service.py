@@ -4,22 +4,188 @@
 Содержит функции для создания Excel файлов с транзакциями.
 """
 
+import asyncio
 import os
-from datetime import datetime, timezone
+import time
+from collections import OrderedDict
+from datetime import datetime
+from io import BytesIO
 from typing import Optional
-from decimal import Decimal
 
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-from openpyxl.utils import get_column_letter
+import xlsxwriter
+from xlsxwriter.format import Format
+from xlsxwriter.worksheet import Worksheet
 from loguru import logger
 
-from src.models import Transaction, TransactionType
-from src.services.database import (
-    get_user_transactions_with_filters,
-    get_user_statistics,
-    get_or_create_user,
-)
+from src.models import TransactionType
+from src.services.database import get_user_export_bundle, get_export_fingerprint
+
+
+## Свойства форматов отчета
+INCOME_COLOR = '#C6EFCE'
+EXPENSE_COLOR = '#FFC7CE'
+
+MONEY_FORMAT = '#,##0.00 ₽'
+AMOUNT_FORMAT = '#,##0.00'
+DATE_FORMAT = 'dd.mm.yyyy'
+TIME_FORMAT = 'hh:mm:ss'
+
+FORMAT_PROPERTIES = {
+    'title': {'bold': True, 'font_size': 14, 'align': 'center'},
+    'section': {'bold': True, 'font_size': 12},
+    'header': {
+        'bold': True, 'font_size': 12, 'font_color': '#FFFFFF', 'bg_color': '#4472C4',
+        'align': 'center', 'valign': 'vcenter', 'border': 1,
+    },
+    'money': {'num_format': MONEY_FORMAT},
+    'income_money': {'num_format': MONEY_FORMAT, 'bg_color': INCOME_COLOR},
+    'expense_money': {'num_format': MONEY_FORMAT, 'bg_color': EXPENSE_COLOR},
+    'income_row': {'bg_color': INCOME_COLOR, 'border': 1},
+    'expense_row': {'bg_color': EXPENSE_COLOR, 'border': 1},
+    'income_amount': {'bg_color': INCOME_COLOR, 'border': 1, 'num_format': AMOUNT_FORMAT},
+    'expense_amount': {'bg_color': EXPENSE_COLOR, 'border': 1, 'num_format': AMOUNT_FORMAT},
+    'income_date': {'bg_color': INCOME_COLOR, 'border': 1, 'num_format': DATE_FORMAT},
+    'expense_date': {'bg_color': EXPENSE_COLOR, 'border': 1, 'num_format': DATE_FORMAT},
+    'income_time': {'bg_color': INCOME_COLOR, 'border': 1, 'num_format': TIME_FORMAT},
+    'expense_time': {'bg_color': EXPENSE_COLOR, 'border': 1, 'num_format': TIME_FORMAT},
+}
+
+HEADERS = ('Дата', 'Время', 'Тип', 'Сумма (₽)', 'Категория', 'Описание')
+
+## Ширина колонок A-F
+COLUMN_WIDTHS = {'A:A': 12, 'B:B': 10, 'C:C': 10, 'D:D': 15, 'E:E': 25, 'F:F': 40}
+
+## Строка шапки таблицы (0-based), данные начинаются со следующей
+HEADER_ROW = 7
+
+## Количество строк, передаваемых в рабочий поток за один раз
+WRITE_BATCH_SIZE = 1000
+
+## Кэш готовых файлов: ключ (user_id, период, отпечаток данных) -> (время истечения, байты)
+EXPORT_CACHE_SIZE = 32
+EXPORT_CACHE_TTL = 3600
+_export_cache: "OrderedDict[tuple, tuple[float, bytes]]" = OrderedDict()
+
+
+## Заголовок отчета, статистика и шапка таблицы
+def _write_preamble(
+    ws: Worksheet,
+    formats: dict[str, Format],
+    period_text: str,
+    stats: dict
+) -> None:
+    """
+    Записать заголовок, блок статистики и шапку таблицы транзакций.
+    
+    В режиме ``constant_memory`` строки пишутся строго по порядку,
+    поэтому преамбула пишется до строк транзакций (строки 1-8).
+    
+    :param ws: Лист книги
+    :param formats: Форматы книги по именам из FORMAT_PROPERTIES
+    :param period_text: Текст периода для заголовка
+    :param stats: Статистика из get_user_statistics
+    :return: None
+    """
+    # Заголовок документа
+    ws.merge_range('A1:F1', f"Отчет по транзакциям {period_text}", formats['title'])
+    
+    # Статистика
+    ws.merge_range('A2:B2', "Статистика", formats['section'])
+    
+    ws.write_string(2, 0, "Общий баланс:")
+    ws.write_number(2, 1, float(stats['balance']), formats['money'])
+    
+    ws.write_string(3, 0, "Доходы:")
+    ws.write_number(3, 1, float(stats['total_income']), formats['income_money'])
+    
+    ws.write_string(4, 0, "Расходы:")
+    ws.write_number(4, 1, float(stats['total_expense']), formats['expense_money'])
+    
+    ws.write_string(5, 0, "Количество операций:")
+    ws.write_number(5, 1, stats['income_count'] + stats['expense_count'])
+    
+    # Заголовок таблицы транзакций
+    ws.write_row(HEADER_ROW, 0, HEADERS, formats['header'])
+
+
+## Создание книги с преамбулой
+def _create_workbook(
+    output: BytesIO,
+    period_text: str,
+    stats: dict
+) -> tuple[xlsxwriter.Workbook, Worksheet, dict[str, Format]]:
+    """
+    Создать книгу, форматы и лист с заголовком, статистикой и шапкой таблицы.
+    
+    :param output: Буфер, в который будет сохранена книга
+    :param period_text: Текст периода для заголовка
+    :param stats: Статистика из get_user_statistics
+    :return: Кортеж (книга, лист, форматы по именам из FORMAT_PROPERTIES)
+    """
+    # remove_timezone: Excel не хранит часовой пояс, время пишется как есть (UTC)
+    wb = xlsxwriter.Workbook(output, {'constant_memory': True, 'remove_timezone': True})
+    ws = wb.add_worksheet("Транзакции")
+    
+    formats = {name: wb.add_format(properties) for name, properties in FORMAT_PROPERTIES.items()}
+    
+    for columns, width in COLUMN_WIDTHS.items():
+        ws.set_column(columns, width)
+    
+    _write_preamble(ws, formats, period_text, stats)
+    return wb, ws, formats
+
+
+## Запись пачки строк транзакций
+def _write_transaction_rows(
+    ws: Worksheet,
+    formats: dict[str, Format],
+    row: int,
+    transactions: list
+) -> int:
+    """
+    Записать пачку транзакций после строки ``row``.
+    
+    Текст пишется через write_string: описание вида "=..." не должно стать формулой.
+    
+    :param ws: Лист книги
+    :param formats: Форматы книги по именам из FORMAT_PROPERTIES
+    :param row: Последняя заполненная строка (0-based)
+    :param transactions: Строки экспорта (см. ``_export_query``)
+    :return: Номер последней записанной строки
+    """
+    # Подпись и форматы по типу считаются один раз на пачку,
+    # а не склейкой ключей и поиском в словаре на каждой строке
+    row_styles = {
+        transaction_type: (
+            label,
+            formats[prefix + 'date'],
+            formats[prefix + 'time'],
+            formats[prefix + 'row'],
+            formats[prefix + 'amount'],
+        )
+        for transaction_type, label, prefix in (
+            (TransactionType.INCOME, "Доход", 'income_'),
+            (TransactionType.EXPENSE, "Расход", 'expense_'),
+        )
+    }
+    write_datetime = ws.write_datetime
+    write_string = ws.write_string
+    write_number = ws.write_number
+    
+    for created_at, transaction_type, amount, category_emoji, category_name, description in transactions:
+        row += 1
+        label, date_format, time_format, row_format, amount_format = row_styles[transaction_type]
+        
+        # Дата и время — числа Excel с форматом колонки, без strftime на каждой строке
+        write_datetime(row, 0, created_at, date_format)
+        write_datetime(row, 1, created_at, time_format)
+        write_string(row, 2, label, row_format)
+        # Сумма уже float со знаком (см. _export_query)
+        write_number(row, 3, amount, amount_format)
+        write_string(row, 4, f"{category_emoji} {category_name}", row_format)
+        write_string(row, 5, description or "", row_format)
+    
+    return row
 
 
 ## Генерация Excel файла с транзакциями
@@ -27,22 +193,29 @@ async def generate_transactions_excel(
     user_id: int,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-) -> str:
+) -> BytesIO:
     """
     Генерировать Excel файл с транзакциями пользователя.
     
     Создает форматированный XLSX файл со всеми транзакциями пользователя
     за указанный период. Включает цветовое выделение, форматирование
-    и итоговую статистику.
+    и итоговую статистику. Транзакции читаются из БД потоково, а файл
+    пишется xlsxwriter в режиме ``constant_memory``: в памяти держится
+    только текущая пачка строк. Запись ячеек и сохранение книги выполняются
+    в рабочем потоке, event loop занят только чтением из БД. Готовый файл
+    возвращается из памяти, без записи на диск и повторного чтения.
+    
+    Если данные периода не менялись с прошлого экспорта (см.
+    ``get_export_fingerprint``), возвращается файл из кэша без генерации.
     
     :param user_id: ID пользователя
     :param start_date: Начало периода (если None - с начала времени)
     :param end_date: Конец периода (если None - до текущего момента)
-    :return: Путь к созданному файлу
+    :return: Буфер с содержимым XLSX файла (позиция в начале)
     :raises Exception: При ошибке создания файла
     
     Example:
-        >>> file_path = await generate_transactions_excel(
+        >>> buffer = await generate_transactions_excel(
         ...     user_id=1,
         ...     start_date=datetime(2024, 1, 1),
         ...     end_date=datetime(2024, 12, 31)
@@ -50,23 +223,6 @@ async def generate_transactions_excel(
     """
     logger.info(f"Начинаю генерацию Excel для пользователя {user_id}")
     
-    # Получаем все транзакции
-    transactions = await get_user_transactions_with_filters(
-        user_id=user_id,
-        start_date=start_date,
-        end_date=end_date,
-        limit=10000,
-        offset=0
-    )
-    
-    # Получаем статистику
-    stats = await get_user_statistics(user_id, start_date, end_date)
-    
-    # Создаем Excel файл
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Транзакции"
-    
     # Определяем период для заголовка
     if start_date and end_date:
         period_text = f"с {start_date.strftime('%d.%m.%Y')} по {end_date.strftime('%d.%m.%Y')}"
@@ -77,125 +233,42 @@ async def generate_transactions_excel(
     else:
         period_text = "за всё время"
     
-    # Стили
-    header_font = Font(bold=True, size=12, color="FFFFFF")
-    header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-    header_alignment = Alignment(horizontal="center", vertical="center")
-    
-    income_fill = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")
-    expense_fill = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
-    
-    border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
-    
-    # Заголовок документа
-    ws.merge_cells('A1:F1')
-    title_cell = ws['A1']
-    title_cell.value = f"Отчет по транзакциям {period_text}"
-    title_cell.font = Font(bold=True, size=14)
-    title_cell.alignment = Alignment(horizontal="center")
-    
-    # Статистика
-    ws.merge_cells('A2:B2')
-    ws['A2'] = "Статистика"
-    ws['A2'].font = Font(bold=True, size=12)
-    
-    ws['A3'] = "Общий баланс:"
-    ws['B3'] = float(stats['balance'])
-    ws['B3'].number_format = '#,##0.00 ₽'
-    
-    ws['A4'] = "Доходы:"
-    ws['B4'] = float(stats['total_income'])
-    ws['B4'].number_format = '#,##0.00 ₽'
-    ws['B4'].fill = income_fill
+    # Повторный экспорт тех же данных отдается из кэша
+    cache_key = (user_id, period_text, *await get_export_fingerprint(user_id, start_date, end_date))
+    cached = _export_cache.get(cache_key)
+    if cached is not None and cached[0] > time.monotonic():
+        _export_cache.move_to_end(cache_key)
+        logger.info(f"Excel файл для пользователя {user_id} взят из кэша")
+        return BytesIO(cached[1])
     
-    ws['A5'] = "Расходы:"
-    ws['B5'] = float(stats['total_expense'])
-    ws['B5'].number_format = '#,##0.00 ₽'
-    ws['B5'].fill = expense_fill
+    output = BytesIO()
     
-    ws['A6'] = "Количество операций:"
-    ws['B6'] = stats['income_count'] + stats['expense_count']
-    
-    # Заголовок таблицы транзакций
-    headers = ['Дата', 'Время', 'Тип', 'Сумма (₽)', 'Категория', 'Описание']
-    header_row = 8
-    
-    for col_num, header in enumerate(headers, 1):
-        cell = ws.cell(row=header_row, column=col_num)
-        cell.value = header
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_alignment
-        cell.border = border
-    
-    # Заполняем транзакции
-    current_row = header_row + 1
-    for transaction in transactions:
-        # Дата
-        ws.cell(row=current_row, column=1, value=transaction.created_at.strftime('%d.%m.%Y'))
+    # Статистика и строки читаются в одной сессии БД, а книга собирается
+    # в рабочем потоке: форматирование ячеек и сжатие не блокируют event loop
+    async with get_user_export_bundle(user_id, start_date, end_date) as (stats, transactions):
+        wb, ws, formats = await asyncio.to_thread(_create_workbook, output, period_text, stats)
         
-        # Время
-        ws.cell(row=current_row, column=2, value=transaction.created_at.strftime('%H:%M:%S'))
-        
-        # Тип
-        type_cell = ws.cell(
-            row=current_row,
-            column=3,
-            value="Доход" if transaction.type == TransactionType.INCOME else "Расход"
-        )
+        row = HEADER_ROW
+        batch = []
+        async for transaction in transactions:
+            batch.append(transaction)
+            if len(batch) >= WRITE_BATCH_SIZE:
+                row = await asyncio.to_thread(_write_transaction_rows, ws, formats, row, batch)
+                batch = []
         
-        # Сумма
-        amount_value = float(transaction.amount)
-        if transaction.type == TransactionType.EXPENSE:
-            amount_value = -amount_value
-        
-        amount_cell = ws.cell(row=current_row, column=4, value=amount_value)
-        amount_cell.number_format = '#,##0.00'
-        
-        # Применяем цвет к строке
-        fill = income_fill if transaction.type == TransactionType.INCOME else expense_fill
-        for col in range(1, 7):
-            ws.cell(row=current_row, column=col).fill = fill
-            ws.cell(row=current_row, column=col).border = border
-        
-        # Категория
-        ws.cell(
-            row=current_row,
-            column=5,
-            value=f"{transaction.category.emoji} {transaction.category.name}"
-        )
-        
-        # Описание
-        ws.cell(
-            row=current_row,
-            column=6,
-            value=transaction.description or ""
-        )
-        
-        current_row += 1
-    
-    # Настройка ширины колонок
-    ws.column_dimensions['A'].width = 12
-    ws.column_dimensions['B'].width = 10
-    ws.column_dimensions['C'].width = 10
-    ws.column_dimensions['D'].width = 15
-    ws.column_dimensions['E'].width = 25
-    ws.column_dimensions['F'].width = 40
+        if batch:
+            row = await asyncio.to_thread(_write_transaction_rows, ws, formats, row, batch)
     
-    # Сохраняем файл
-    os.makedirs("logs", exist_ok=True)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"logs/transactions_export_{user_id}_{timestamp}.xlsx"
+    await asyncio.to_thread(wb.close)
+    output.seek(0)
     
-    wb.save(filename)
-    logger.success(f"✅ Excel файл создан: {filename}")
+    _export_cache[cache_key] = (time.monotonic() + EXPORT_CACHE_TTL, output.getvalue())
+    _export_cache.move_to_end(cache_key)
+    if len(_export_cache) > EXPORT_CACHE_SIZE:
+        _export_cache.popitem(last=False)
+    logger.success(f"✅ Excel файл создан для пользователя {user_id}: {output.getbuffer().nbytes} байт")
     
-    return filename
+    return output
 
 
 ## Удаление временного файла экспорта
@@ -6,28 +6,142 @@ and parsing of transaction text via AgentRouter API (DeepSeek V3.2).
 """
 
 import asyncio
-import json
+import hashlib
 import random
+import re
 import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import Optional, Dict, Any
-from pathlib import Path
 from decimal import Decimal, InvalidOperation
 
+import ffmpeg
 import httpx
-from pywhispercpp.model import Model
-from pywhispercpp.utils import download_model
+import numpy as np
+import orjson
+from tenacity import (
+    AsyncRetrying,
+    RetryCallState,
+    retry_if_exception_type,
+    retry_if_result,
+    stop_after_attempt,
+    stop_after_delay,
+)
 from loguru import logger
+from rapidfuzz import fuzz, process
 
 from config import get_settings
+from src.services.whisper_backends import TranscriptionBackend, create_transcription_backend
+from src.utils.sanitizer import sanitize_exception_message
 
 
 ## Model configuration
-WHISPER_MODEL_NAME = "base"
+CATEGORY_MATCH_SCORE_CUTOFF = 80
 AGENTROUTER_BASE_URL = "https://agentrouter.org/v1"
 AGENTROUTER_MODEL = "deepseek-v3.2"
 
-## Global variable for storing loaded Whisper.cpp model
-_whisper_model = None
+## Prompt for parsing transaction via LLM (only {text} is substituted per call)
+TRANSACTION_PROMPT_TEMPLATE = """Проанализируй текст и извлеки информацию о финансовой транзакции.
+Верни JSON с полями:
+- type: "income" или "expense"
+- amount: число (только сумма в рублях, без валюты)
+- category: строка (категория транзакции)
+- description: строка или null (дополнительное описание)
+
+Категории расходов: Продукты, Транспорт, Рестораны, Здоровье, Дом, Развлечения, Одежда, Другое
+Категории доходов: Зарплата, Фриланс, Подарок, Инвестиции, Другое
+
+Если чего-то нет - используй null.
+Если "тысяч" или "тыс" - умножь сумму на 1000.
+
+Текст: "{text}"
+
+Верни ТОЛЬКО JSON, без дополнительного текста."""
+
+## Local fast-path for short phrases like "такси 500" / "зарплата 60 тысяч"
+AMOUNT_RE = re.compile(r"(\d{1,3}(?:[ \u00a0]\d{3})+|\d+)(?:[.,](\d{1,2}))?")
+## Letter runs in any script: a Latin word ("такси uber 500") must reject the fast path, not be skipped
+WORD_RE = re.compile(r"[^\W\d_]+")
+THOUSAND_WORDS = frozenset({"тыс", "тысяча", "тысячи", "тысяч"})
+FILLER_WORDS = frozenset({
+    "р", "руб", "рубль", "рубля", "рублей", "на", "за", "в",
+    "потратил", "потратила", "заплатил", "заплатила", "купил", "купила",
+    "получил", "получила", "пришла", "пришло",
+}) | THOUSAND_WORDS
+CATEGORY_KEYWORDS: Dict[str, tuple[str, str]] = {
+    "продукты": ("expense", "Продукты"),
+    "продуктов": ("expense", "Продукты"),
+    "такси": ("expense", "Транспорт"),
+    "метро": ("expense", "Транспорт"),
+    "автобус": ("expense", "Транспорт"),
+    "бензин": ("expense", "Транспорт"),
+    "проезд": ("expense", "Транспорт"),
+    "кафе": ("expense", "Рестораны и кафе"),
+    "ресторан": ("expense", "Рестораны и кафе"),
+    "обед": ("expense", "Рестораны и кафе"),
+    "кофе": ("expense", "Рестораны и кафе"),
+    "аптека": ("expense", "Аптека"),
+    "лекарства": ("expense", "Аптека"),
+    "кино": ("expense", "Развлечения"),
+    "интернет": ("expense", "Связь и интернет"),
+    "связь": ("expense", "Связь и интернет"),
+    "одежда": ("expense", "Одежда"),
+    "одежду": ("expense", "Одежда"),
+    "зарплата": ("income", "Зарплата"),
+    "зарплату": ("income", "Зарплата"),
+    "зарплаты": ("income", "Зарплата"),
+    "аванс": ("income", "Зарплата"),
+    "фриланс": ("income", "Фриланс"),
+}
+
+## Fallback for providers that ignore JSON mode and wrap the reply in ```json fences
+JSON_FENCE_RE = re.compile(r"```(?:json)?\s*(\{.*\})\s*```", re.S)
+
+## Upper bound for a successful AgentRouter response body
+MAX_RESPONSE_BYTES = 64 * 1024
+
+## Request payload fields shared by all parsing calls
+AGENTROUTER_BASE_PAYLOAD = {
+    "model": AGENTROUTER_MODEL,
+    "temperature": 0.0,
+    ## JSON mode: the reply is a bare JSON object, no ```json fences
+    "response_format": {"type": "json_object"},
+    ## Caps runaway replies; leaves room for a long description in Cyrillic (2+ tokens per word),
+    ## so a valid JSON object is not cut off mid-string
+    "max_tokens": 256
+}
+
+## Whisper expects 16 kHz mono audio
+WHISPER_SAMPLE_RATE = 16000
+
+## Loaded speech recognition backend (selected by WHISPER_BACKEND)
+_whisper_backend: Optional[TranscriptionBackend] = None
+
+## One decode at a time: each call already uses WHISPER_THREADS cores,
+## concurrent decodes would oversubscribe the CPU and slow every request down.
+## A dedicated worker also keeps inference out of the default to_thread pool
+_whisper_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="whisper")
+
+## LRU cache of transcripts keyed on audio content hash (forwarded voice notes repeat byte-for-byte)
+TRANSCRIPT_CACHE_SIZE = 256
+_transcript_cache: "OrderedDict[bytes, str]" = OrderedDict()
+
+## Retry policy for AgentRouter requests (network errors, 408, 429 and 5xx only)
+RETRY_INITIAL_DELAY = 0.5
+RETRY_MAX_DELAY = 4.0
+RETRY_JITTER = 0.2
+## 4xx statuses that may succeed on retry; any other 4xx fails immediately
+RETRYABLE_CLIENT_STATUSES = frozenset({408, 429})
+## Base delay per retry number: 0.5, 1, 2, 4, 4 ... (capped at RETRY_MAX_DELAY)
+RETRY_BACKOFF_TABLE = tuple(min(RETRY_INITIAL_DELAY * 2 ** i, RETRY_MAX_DELAY) for i in range(8))
+
+## Shared HTTP client for AgentRouter (keep-alive connection pool, created lazily)
+_http_client: Optional[httpx.AsyncClient] = None
+
+## LRU cache of successful parses keyed on normalized text ("обед 300", "такси 500" repeat often)
+PARSE_CACHE_SIZE = 1024
+_parse_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
 
 
 class AgentRouterError(Exception):
@@ -51,43 +165,33 @@ class ParsingError(AgentRouterError):
     pass
 
 
-## Load Whisper.cpp model asynchronously
-async def _load_whisper_model():
+## Load Whisper backend asynchronously
+async def _load_whisper_backend() -> TranscriptionBackend:
     """
-    Load Whisper.cpp model into memory (lazy loading).
+    Load the speech recognition backend into memory (lazy loading).
     
-    Model is loaded once on first call and kept in memory.
-    Uses 'base' model as a compromise between speed and accuracy.
-    Whisper.cpp provides 2-4x better performance than openai-whisper.
+    The backend is selected by WHISPER_BACKEND (see ``src.services.whisper_backends``):
+    faster-whisper (CTranslate2, int8) or Whisper.cpp. Only the selected
+    library has to be installed. Loading runs in a worker thread.
     
-    :return: Loaded Whisper.cpp model
-    :raises TranscriptionError: If model loading fails
+    :return: Loaded transcription backend
+    :raises TranscriptionError: If backend library is missing or model loading fails
     """
-    global _whisper_model
+    global _whisper_backend
     
-    if _whisper_model is None:
-        logger.info(f"Загружаю модель Whisper.cpp: {WHISPER_MODEL_NAME}")
+    if _whisper_backend is None:
+        backend = create_transcription_backend(get_settings())
+        
         try:
-            ## Ensure model is downloaded first (cached if already exists)
-            logger.info(f"Проверяю наличие модели {WHISPER_MODEL_NAME}...")
-            model_path = await asyncio.to_thread(download_model, WHISPER_MODEL_NAME)
-            logger.success(f"Модель найдена: {model_path}")
-            
-            ## Load model in thread to avoid blocking event loop
-            ## Pass model name directly - pywhispercpp handles the rest
-            _whisper_model = await asyncio.to_thread(
-                Model,
-                WHISPER_MODEL_NAME,
-                n_threads=4
-            )
-            logger.success(f"Модель Whisper.cpp '{WHISPER_MODEL_NAME}' успешно загружена")
+            await asyncio.to_thread(backend.load)
         except Exception as e:
-            from src.utils.sanitizer import sanitize_exception_message
             safe_error = sanitize_exception_message(e)
-            logger.error(f"Ошибка загрузки модели Whisper.cpp: {safe_error}")
-            raise TranscriptionError(f"Не удалось загрузить модель Whisper.cpp: {safe_error}")
+            logger.error(f"Ошибка загрузки модели {backend.name}: {safe_error}")
+            raise TranscriptionError(f"Не удалось загрузить модель {backend.name}: {safe_error}")
+        
+        _whisper_backend = backend
     
-    return _whisper_model
+    return _whisper_backend
 
 
 ## Initialize Whisper model on startup
@@ -95,97 +199,238 @@ async def initialize_whisper():
     """
     Initialize Whisper model during bot startup.
     
-    Preloads model to avoid delays on first voice message.
+    Preloads model and runs a throwaway decode of one second of silence,
+    so buffer allocation happens at startup instead of on the first voice message.
     Should be called during bot initialization.
     
     :return: None
     :raises TranscriptionError: If model loading fails
     """
-    await _load_whisper_model()
-    logger.info("Whisper.cpp готов к работе")
+    backend = await _load_whisper_backend()
+    
+    ## Warm-up decode: 16 kHz mono float32 samples, as expected by both backends
+    try:
+        silence = np.zeros(WHISPER_SAMPLE_RATE, dtype=np.float32)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(_whisper_executor, backend.warm_up, silence)
+    except Exception as e:
+        logger.warning(f"Прогрев {backend.name} не удался: {sanitize_exception_message(e)}")
+    
+    logger.info(f"{backend.name} готов к работе")
+
+
+## Decode in-memory audio to 16 kHz mono PCM
+def _decode_pcm(data: bytes) -> np.ndarray:
+    """
+    Decode and resample audio bytes to 16 kHz mono float32 samples via ffmpeg.
+    
+    The encoded audio is piped to ffmpeg's stdin, so nothing touches the disk.
+    
+    :param data: Encoded audio (e.g. OGG/Opus voice note)
+    :return: Read-only float32 samples
+    :raises ffmpeg.Error: If ffmpeg fails to decode the data
+    """
+    out, _ = (
+        ffmpeg
+        .input("pipe:")
+        .output("pipe:", format="f32le", acodec="pcm_f32le", ac=1, ar=WHISPER_SAMPLE_RATE)
+        .run(input=data, capture_stdout=True, capture_stderr=True, quiet=True)
+    )
+    return np.frombuffer(out, dtype=np.float32)
 
 
-## Transcribe audio to text via local Whisper.cpp
-async def transcribe_audio(audio_path: str) -> str:
+## Transcribe audio to text via local Whisper
+async def transcribe_audio(audio: bytes) -> str:
     """
-    Transcribe audio file to text via local Whisper.cpp.
+    Transcribe encoded audio to text via local Whisper.
     
-    Uses locally installed Whisper.cpp model to convert speech to text.
-    Provides 2-4x better performance compared to openai-whisper.
+    Uses the locally loaded Whisper backend (faster-whisper or Whisper.cpp)
+    to convert speech to text.
     Works completely offline, requires no API keys and is free.
+    Audio bytes (e.g. a downloaded voice note) are decoded in memory
+    without a temporary file.
     
-    :param audio_path: Path to audio file
+    :param audio: Encoded audio bytes (e.g. OGG/Opus voice note)
     :return: Recognized text
     :raises TranscriptionError: If transcription fails
-    :raises FileNotFoundError: If audio file not found
     
     Example:
-        >>> text = await transcribe_audio("voice_message.ogg")
+        >>> text = await transcribe_audio(voice_bytes)
         >>> print(text)
         "Потратил 500 рублей на продукты"
     """
-    if not Path(audio_path).exists():
-        raise FileNotFoundError(f"Аудиофайл не найден: {audio_path}")
-    
-    logger.info(f"Начинаю транскрипцию аудио через Whisper.cpp: {audio_path}")
+    ## Identical audio: skip decoding and inference
+    cache_key = hashlib.blake2b(audio, digest_size=16).digest()
+    cached = _transcript_cache.get(cache_key)
+    if cached is not None:
+        _transcript_cache.move_to_end(cache_key)
+        logger.info(f"Транскрипция взята из кэша: '{cached[:100]}...'")
+        return cached
+    logger.info(f"Начинаю транскрипцию аудио: {len(audio)} байт")
     
     try:
-        model = await _load_whisper_model()
+        backend = await _load_whisper_backend()
         
-        ## Transcribe with Whisper.cpp
-        result = await asyncio.to_thread(
-            model.transcribe,
-            audio_path,
-            language="ru"
-        )
+        ## Decode in the default pool: it overlaps with another message's inference
+        samples = await asyncio.to_thread(_decode_pcm, audio)
         
-        ## model.transcribe() returns list of segment objects with .text attribute
-        if isinstance(result, str):
-            text = result.strip()
-        elif isinstance(result, list) and result:
-            ## Each segment is an object with .text, .t0, .t1 attributes
-            text = " ".join(segment.text for segment in result if hasattr(segment, 'text')).strip()
-        else:
-            raise TranscriptionError(f"Неожиданный тип результата транскрипции: {type(result)}")
+        ## Transcribe in the Whisper worker (queued behind other voice messages)
+        loop = asyncio.get_running_loop()
+        text = await loop.run_in_executor(_whisper_executor, backend.transcribe, samples)
         
         if not text:
             raise TranscriptionError("Пустой результат транскрипции")
         
-        logger.success(f"Успешно транскрибировано через Whisper.cpp: '{text[:100]}...'")
+        _transcript_cache[cache_key] = text
+        if len(_transcript_cache) > TRANSCRIPT_CACHE_SIZE:
+            _transcript_cache.popitem(last=False)
+        
+        logger.success(f"Успешно транскрибировано через {backend.name}: '{text[:100]}...'")
         return text
         
-    except FileNotFoundError:
-        raise
     except TranscriptionError:
         raise
     except Exception as e:
-        from src.utils.sanitizer import sanitize_exception_message
         safe_error = sanitize_exception_message(e)
-        logger.error(f"Ошибка при транскрипции через Whisper.cpp: {safe_error}")
+        logger.error(f"Ошибка при транскрипции аудио: {safe_error}")
         raise TranscriptionError(f"Не удалось транскрибировать аудио: {safe_error}")
 
 
-## Calculate exponential backoff delay with jitter
-def _calculate_backoff_delay(attempt: int, base_delay: float = 0.5, jitter_percent: float = 0.2) -> float:
+## Get shared HTTP client for AgentRouter
+def _get_http_client() -> httpx.AsyncClient:
+    """
+    Get shared AgentRouter HTTP client, creating it on first use.
+    
+    Reusing one client keeps TCP+TLS connections alive between requests
+    and retries instead of paying DNS resolution and handshake every call.
+    Per-request timeouts are passed to ``client.post``.
+    
+    :return: Shared httpx.AsyncClient
+    
+    Example:
+        >>> client = _get_http_client()
+        >>> response = await client.post("/chat/completions", content=orjson.dumps(payload), timeout=10)
+    """
+    global _http_client
+    
+    if _http_client is None or _http_client.is_closed:
+        settings = get_settings()
+        _http_client = httpx.AsyncClient(
+            base_url=AGENTROUTER_BASE_URL,
+            timeout=settings.agentrouter_timeout,
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=50)
+        )
+    
+    return _http_client
+
+
+## Build AgentRouter request headers (cached per API key)
+@lru_cache(maxsize=1)
+def _agentrouter_headers(api_key: str) -> dict[str, str]:
+    """
+    Build AgentRouter request headers once per API key.
+    
+    :param api_key: AgentRouter API key
+    :return: Headers with Authorization and Content-Type
+    """
+    return {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+
+
+## Close shared HTTP client on shutdown
+async def close_http_client() -> None:
     """
-    Calculate exponential backoff delay with jitter.
+    Close shared AgentRouter HTTP client and its connection pool.
     
-    Uses formula: base_delay * (2 ^ attempt) ± jitter_percent
-    Example delays: 0.5s, 1s, 2s with ±20% jitter
+    Should be called during bot shutdown.
     
-    :param attempt: Current attempt number (0-based)
-    :param base_delay: Base delay in seconds
-    :param jitter_percent: Jitter percentage (0.0-1.0)
-    :return: Delay in seconds with jitter applied
+    :return: None
     
     Example:
-        >>> delay = _calculate_backoff_delay(0)  # ~0.4-0.6s
-        >>> delay = _calculate_backoff_delay(1)  # ~0.8-1.2s
-        >>> delay = _calculate_backoff_delay(2)  # ~1.6-2.4s
+        >>> await close_http_client()
+    """
+    global _http_client
+    
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+## Wait before retry: honor Retry-After, otherwise exponential backoff with jitter
+def _wait_retry_after_or_backoff(retry_state: RetryCallState) -> float:
+    """
+    Compute delay before the next AgentRouter attempt.
+    
+    Uses numeric ``Retry-After`` header of a 429/5xx response when present
+    (capped at RETRY_MAX_DELAY), otherwise the RETRY_BACKOFF_TABLE delay
+    with ±20% jitter: ~0.5s, 1s, 2s ... up to RETRY_MAX_DELAY.
+    
+    :param retry_state: Tenacity retry state
+    :return: Delay in seconds
     """
-    exponential_delay = base_delay * (2 ** attempt)
-    jitter = exponential_delay * jitter_percent * (2 * random.random() - 1)
-    return exponential_delay + jitter
+    outcome = retry_state.outcome
+    if outcome is not None and not outcome.failed:
+        retry_after = outcome.result().headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            return min(float(retry_after), RETRY_MAX_DELAY)
+    
+    delay = RETRY_BACKOFF_TABLE[min(retry_state.attempt_number, len(RETRY_BACKOFF_TABLE)) - 1]
+    return delay + delay * RETRY_JITTER * (2 * random.random() - 1)
+
+
+## Check whether AgentRouter response status is worth retrying
+def _is_retryable_response(response: httpx.Response) -> bool:
+    """
+    Check if response is a transient server-side failure.
+    
+    :param response: AgentRouter HTTP response
+    :return: True for 408, 429 and 5xx, False for other 4xx client errors (fail fast)
+    """
+    return response.status_code in RETRYABLE_CLIENT_STATUSES or response.status_code >= 500
+
+
+## Log retry attempt
+def _log_retry(retry_state: RetryCallState) -> None:
+    """
+    Log scheduled retry of AgentRouter request.
+    
+    :param retry_state: Tenacity retry state
+    :return: None
+    """
+    outcome = retry_state.outcome
+    if outcome.failed:
+        reason = type(outcome.exception()).__name__
+    else:
+        reason = f"HTTP {outcome.result().status_code}"
+    
+    logger.info(
+        f"Повтор запроса к AgentRouter через {retry_state.next_action.sleep:.2f}s "
+        f"(попытка {retry_state.attempt_number}, причина: {reason})"
+    )
+
+
+## Decode LLM reply content into transaction dict
+def _load_transaction_json(content: str) -> Dict[str, Any]:
+    """
+    Decode the JSON object from LLM reply content.
+    
+    JSON mode replies are decoded directly; the fence regex only runs
+    when that fails, so the happy path does no extra scanning.
+    
+    :param content: Message content from AgentRouter
+    :return: Decoded JSON object
+    :raises ValueError: If content contains no valid JSON
+    """
+    try:
+        return orjson.loads(content)
+    except orjson.JSONDecodeError:
+        match = JSON_FENCE_RE.search(content)
+        if match is None:
+            raise
+        return orjson.loads(match.group(1))
 
 
 ## Parse transaction text via AgentRouter API
@@ -199,7 +444,10 @@ async def parse_transaction_text(text: str) -> Optional[Dict[str, Any]]:
     - Category
     - Description
     
-    Uses exponential backoff with jitter for retries and enforces total deadline.
+    Retries only network errors, 408, 429 and 5xx responses (exponential backoff
+    with jitter, honoring Retry-After) within the total deadline; other 4xx and
+    malformed replies fail immediately. Successful results are kept in an
+    in-process LRU cache keyed on the normalized text.
     
     :param text: Text to parse (will be truncated to max_text_length)
     :return: Dictionary with recognized data or None on error
@@ -218,196 +466,258 @@ async def parse_transaction_text(text: str) -> Optional[Dict[str, Any]]:
     if not text or not text.strip():
         raise ParsingError("Текст для парсинга пустой")
     
+    ## Snapshot settings once: the retry closure below reads them on every attempt
     settings = get_settings()
+    max_text_length = settings.agentrouter_max_text_length
+    api_key = settings.agentrouter_api_key
+    max_retries = settings.agentrouter_max_retries
+    total_deadline = settings.agentrouter_total_deadline
+    base_timeout = settings.agentrouter_timeout
     
     ## Truncate text to maximum allowed length
-    if len(text) > settings.agentrouter_max_text_length:
-        logger.warning(f"Text truncated from {len(text)} to {settings.agentrouter_max_text_length} characters")
-        text = text[:settings.agentrouter_max_text_length]
+    if len(text) > max_text_length:
+        logger.warning(f"Text truncated from {len(text)} to {max_text_length} characters")
+        text = text[:max_text_length]
+    
+    ## Repeated phrase: skip the LLM round-trip
+    cache_key = " ".join(text.split()).lower()
+    cached = _parse_cache.get(cache_key)
+    if cached is not None:
+        _parse_cache.move_to_end(cache_key)
+        logger.info(f"Результат парсинга взят из кэша: {cached}")
+        return dict(cached)
     
     logger.info(f"Парсинг текста транзакции через AgentRouter: '{text[:50]}...'")
     
-    if not settings.agentrouter_api_key:
+    if not api_key:
         raise ParsingError(
             "AgentRouter API ключ не настроен. "
             "Добавьте AGENTROUTER_API_KEY в .env файл. "
             "Получить ключ: https://agentrouter.org/console/token"
         )
     
-    from src.utils.sanitizer import sanitize_headers, mask_sensitive_value
+    prompt = TRANSACTION_PROMPT_TEMPLATE.format(text=text)
+    
+    ## Send request to AgentRouter: only the prompt differs between calls
+    headers = _agentrouter_headers(api_key)
+    body = orjson.dumps({
+        **AGENTROUTER_BASE_PAYLOAD,
+        "messages": [{"role": "user", "content": prompt}]
+    })
+    
+    client = _get_http_client()
+    
+    ## Track total time spent for deadline enforcement (integer nanoseconds)
+    start_ns = time.monotonic_ns()
+    deadline_ns = start_ns + total_deadline * 1_000_000_000
+    
+    async def send_request() -> httpx.Response:
+        ## Each attempt gets at most the time left before the total deadline
+        remaining_time = (deadline_ns - time.monotonic_ns()) / 1e9
+        attempt_timeout = max(min(base_timeout, remaining_time), 0.1)
+        return await client.post(
+            "/chat/completions",
+            headers=headers,
+            content=body,
+            timeout=attempt_timeout
+        )
     
-    # Mask API key for logging
-    safe_api_key = mask_sensitive_value(settings.agentrouter_api_key, visible_chars=4)
+    retrying = AsyncRetrying(
+        stop=(
+            stop_after_attempt(max_retries)
+            | stop_after_delay(total_deadline)
+        ),
+        wait=_wait_retry_after_or_backoff,
+        retry=(
+            retry_if_exception_type(httpx.TransportError)
+            | retry_if_result(_is_retryable_response)
+        ),
+        before_sleep=_log_retry,
+        ## Out of attempts on a 408/429/5xx: return the last response for error handling below
+        retry_error_callback=lambda retry_state: retry_state.outcome.result(),
+        reraise=True
+    )
     
-    ## Prompt for parsing transaction via LLM
-    prompt = """Проанализируй текст и извлеки информацию о финансовой транзакции.
-Верни JSON с полями:
-- type: "income" или "expense"
-- amount: число (только сумма в рублях, без валюты)
-- category: строка (категория транзакции)
-- description: строка или null (дополнительное описание)
+    try:
+        response = await retrying(send_request)
+    except httpx.TimeoutException:
+        logger.warning(f"Timeout при запросе к AgentRouter после {(time.monotonic_ns() - start_ns) / 1e9:.2f}s")
+        raise ParsingError(
+            "AgentRouter API недоступен (timeout). "
+            "Проверьте интернет соединение и попробуйте позже."
+        )
+    except httpx.TransportError as e:
+        safe_error = sanitize_exception_message(e)
+        logger.error(f"Сетевая ошибка при запросе к AgentRouter: {safe_error}")
+        raise ParsingError(f"Ошибка при обращении к AgentRouter API: {safe_error}")
+    
+    if response.status_code != 200:
+        # Sanitize response for logging (may contain sensitive data);
+        # decode only the logged prefix instead of charset-sniffing the whole body
+        safe_response = response.content[:200].decode("utf-8", "replace")
+        logger.error(f"AgentRouter API ошибка {response.status_code}: {safe_response}")
+        
+        ## Handle authentication errors (401)
+        if response.status_code == 401:
+            raise ParsingError(
+                "Неверный API ключ AgentRouter. "
+                "Проверьте AGENTROUTER_API_KEY в .env файле. "
+                "Получить новый ключ: https://agentrouter.org/console/token"
+            )
+        
+        raise ParsingError(f"AgentRouter API вернул ошибку: {response.status_code}")
+    
+    ## A four-field JSON reply is well under this; anything larger is not a valid answer
+    body = response.content
+    if len(body) > MAX_RESPONSE_BYTES:
+        logger.error(f"Слишком большой ответ от AgentRouter: {len(body)} байт")
+        raise ParsingError(
+            "Не удалось обработать ответ от AgentRouter API. "
+            "Попробуйте еще раз или обратитесь к администратору."
+        )
+    
+    try:
+        result = orjson.loads(body)
+        choice = result["choices"][0]
+        ## Reply cut off by max_tokens: the JSON object is incomplete
+        if choice.get("finish_reason") == "length":
+            logger.error("Ответ AgentRouter обрезан по max_tokens")
+            raise ParsingError(
+                "Описание слишком длинное для распознавания, сформулируйте короче"
+            )
+        content = choice["message"]["content"]
+        transaction_data = _load_transaction_json(content)
+    except (ValueError, KeyError, IndexError, TypeError, AttributeError) as e:
+        safe_error = sanitize_exception_message(e)
+        logger.error(f"Ошибка парсинга ответа от AgentRouter: {safe_error}")
+        raise ParsingError(
+            "Не удалось обработать ответ от AgentRouter API. "
+            "Попробуйте еще раз или обратитесь к администратору."
+        )
+    
+    ## Validate data
+    if not transaction_data.get("type") in ["income", "expense"]:
+        raise ParsingError("Некорректный тип транзакции")
+    
+    ## Convert amount to Decimal for precision: ints and strings convert directly,
+    ## floats go through str() so Decimal gets "1.5" rather than the binary expansion
+    raw_amount = transaction_data.get("amount", 0)
+    try:
+        if type(raw_amount) is int or isinstance(raw_amount, str):
+            amount = Decimal(raw_amount)
+        else:
+            amount = Decimal(str(raw_amount))
+    except (ValueError, InvalidOperation):
+        raise ParsingError("Некорректный формат суммы")
+    
+    if amount <= 0:
+        raise ParsingError("Некорректная сумма транзакции")
+    
+    if amount > 10_000_000:
+        raise ParsingError("Сумма слишком большая (максимум 10 000 000)")
+    
+    ## Replace amount with Decimal
+    transaction_data["amount"] = amount
+    
+    ## Only successful parses are cached; errors raise before reaching here
+    _parse_cache[cache_key] = dict(transaction_data)
+    if len(_parse_cache) > PARSE_CACHE_SIZE:
+        _parse_cache.popitem(last=False)
+    
+    logger.success(f"Успешно распознано через AgentRouter: {transaction_data}")
+    return transaction_data
 
-Категории расходов: Продукты, Транспорт, Рестораны, Здоровье, Дом, Развлечения, Одежда, Другое
-Категории доходов: Зарплата, Фриланс, Подарок, Инвестиции, Другое
 
-Если чего-то нет - используй null.
-Если "тысяч" или "тыс" - умножь сумму на 1000.
+## Parse trivial transaction phrases locally without the LLM
+def try_parse_local(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Parse a short "keyword + amount" phrase without calling AgentRouter.
+    
+    Handles only unambiguous inputs: exactly one amount, exactly one known
+    category keyword and no other words except fillers ("рублей", "на", ...).
+    Anything else returns None and should go to parse_transaction_text.
+    "тыс"/"тысяч" multiplies the amount by 1000, as the LLM prompt does.
+    
+    :param text: Recognized text
+    :return: Dictionary in parse_transaction_text format or None
+    
+    Example:
+        >>> try_parse_local("Такси 500 рублей")
+        {"type": "expense", "amount": Decimal('500'), "category": "Транспорт", "description": None}
+        >>> try_parse_local("Купил продукты и корм для кота на 500") is None
+        True
+        >>> try_parse_local("Такси uber 500") is None
+        True
+    """
+    text_lower = text.lower()
+    
+    amounts = AMOUNT_RE.findall(text_lower)
+    if len(amounts) != 1:
+        return None
+    
+    keyword_match = None
+    has_thousands = False
+    for word in WORD_RE.findall(text_lower):
+        if word in THOUSAND_WORDS:
+            has_thousands = True
+        elif word in CATEGORY_KEYWORDS:
+            if keyword_match is not None and keyword_match != CATEGORY_KEYWORDS[word]:
+                return None
+            keyword_match = CATEGORY_KEYWORDS[word]
+        elif word not in FILLER_WORDS:
+            return None
+    
+    if keyword_match is None:
+        return None
+    
+    integer_part, fraction_part = amounts[0]
+    amount = Decimal(integer_part.replace(" ", "").replace("\u00a0", ""))
+    if fraction_part:
+        amount += Decimal(f"0.{fraction_part}")
+    if has_thousands:
+        amount *= 1000
+    
+    if amount <= 0 or amount > 10_000_000:
+        return None
+    
+    transaction_type, category = keyword_match
+    transaction_data = {
+        "type": transaction_type,
+        "amount": amount,
+        "category": category,
+        "description": None
+    }
+    logger.info(f"Транзакция распознана локально без AgentRouter: {transaction_data}")
+    return transaction_data
 
-Текст: "{text}"
 
-Верни ТОЛЬКО JSON, без дополнительного текста.""".format(text=text)
+## Build lookup structures for category matching (cached per category list, i.e. per user)
+@lru_cache(maxsize=32)
+def _build_category_index(
+    categories: tuple[tuple[int, str], ...],
+    default_category_name: str
+) -> tuple[dict[str, tuple[int, str]], tuple[str, ...], tuple[Optional[int], str]]:
+    """
+    Index categories for find_matching_category.
     
-    ## Send request to AgentRouter
-    headers = {
-        "Authorization": f"Bearer {settings.agentrouter_api_key}",
-        "Content-Type": "application/json"
-    }
+    Cached on the (id, name) pairs, so repeated calls with the same category
+    list reuse the lowercased names instead of rebuilding them.
     
-    payload = {
-        "model": AGENTROUTER_MODEL,
-        "messages": [
-            {"role": "user", "content": prompt}
-        ],
-        "temperature": 0.0,
-        "max_tokens": 500
-    }
+    :param categories: Tuple of (category_id, category_name) pairs
+    :param default_category_name: Default category name
+    :return: Tuple (id/name by lowercased name, lowercased names in list order, default match)
+    """
+    by_lower_name: dict[str, tuple[int, str]] = {}
+    default_match: tuple[Optional[int], str] = (None, default_category_name)
     
-    ## Track total time spent for deadline enforcement
-    start_time = time.monotonic()
-    last_error = None
+    for cat_id, cat_name in categories:
+        ## First category wins on duplicate names, as in a linear scan
+        by_lower_name.setdefault(cat_name.lower(), (cat_id, cat_name))
+        if default_match[0] is None and cat_name == default_category_name:
+            default_match = (cat_id, cat_name)
     
-    for attempt in range(settings.agentrouter_max_retries):
-        ## Check if we exceeded total deadline
-        elapsed = time.monotonic() - start_time
-        if elapsed >= settings.agentrouter_total_deadline:
-            logger.error(f"Total deadline exceeded: {elapsed:.2f}s >= {settings.agentrouter_total_deadline}s")
-            raise ParsingError(
-                f"AgentRouter API не ответил за отведенное время ({settings.agentrouter_total_deadline}s). "
-                "Попробуйте позже."
-            )
-        
-        ## Calculate remaining time for this attempt
-        remaining_time = settings.agentrouter_total_deadline - elapsed
-        attempt_timeout = min(settings.agentrouter_timeout, remaining_time)
-        
-        try:
-            async with httpx.AsyncClient(timeout=attempt_timeout) as client:
-                response = await client.post(
-                    f"{AGENTROUTER_BASE_URL}/chat/completions",
-                    headers=headers,
-                    json=payload
-                )
-                
-                if response.status_code != 200:
-                    # Sanitize response for logging (may contain sensitive data)
-                    safe_response = response.text[:200] if len(response.text) > 200 else response.text
-                    logger.error(f"AgentRouter API ошибка {response.status_code}: {safe_response}")
-                    
-                    ## Handle authentication errors (401)
-                    if response.status_code == 401:
-                        raise ParsingError(
-                            "Неверный API ключ AgentRouter. "
-                            "Проверьте AGENTROUTER_API_KEY в .env файле. "
-                            "Получить новый ключ: https://agentrouter.org/console/token"
-                        )
-                    
-                    last_error = ParsingError(f"AgentRouter API вернул ошибку: {response.status_code}")
-                    
-                    if attempt < settings.agentrouter_max_retries - 1:
-                        delay = _calculate_backoff_delay(attempt)
-                        logger.info(f"Повтор через {delay:.2f}s (попытка {attempt + 1}/{settings.agentrouter_max_retries})")
-                        await asyncio.sleep(delay)
-                        continue
-                    raise last_error
-                
-                result = response.json()
-                content = result["choices"][0]["message"]["content"].strip()
-                
-                ## Extract JSON from response (may be wrapped in ```json```)
-                if "```json" in content:
-                    content = content.split("```json")[1].split("```")[0].strip()
-                elif "```" in content:
-                    content = content.split("```")[1].split("```")[0].strip()
-                
-                transaction_data = json.loads(content)
-                
-                ## Validate data
-                if not transaction_data.get("type") in ["income", "expense"]:
-                    raise ParsingError("Некорректный тип транзакции")
-                
-                ## Convert amount to Decimal for precision
-                try:
-                    amount = Decimal(str(transaction_data.get("amount", 0)))
-                except (ValueError, InvalidOperation):
-                    raise ParsingError("Некорректный формат суммы")
-                
-                if amount <= 0:
-                    raise ParsingError("Некорректная сумма транзакции")
-                
-                if amount > 10_000_000:
-                    raise ParsingError("Сумма слишком большая (максимум 10 000 000)")
-                
-                ## Replace amount with Decimal
-                transaction_data["amount"] = amount
-                
-                logger.success(f"Успешно распознано через AgentRouter: {transaction_data}")
-                return transaction_data
-                
-        except httpx.TimeoutException:
-            logger.warning(f"Timeout при запросе к AgentRouter (попытка {attempt + 1}/{settings.agentrouter_max_retries})")
-            last_error = ParsingError(
-                "AgentRouter API недоступен (timeout). "
-                "Проверьте интернет соединение и попробуйте позже."
-            )
-            
-            if attempt < settings.agentrouter_max_retries - 1:
-                delay = _calculate_backoff_delay(attempt)
-                logger.info(f"Повтор через {delay:.2f}s")
-                await asyncio.sleep(delay)
-                continue
-            raise last_error
-            
-        except (json.JSONDecodeError, KeyError) as e:
-            from src.utils.sanitizer import sanitize_exception_message
-            safe_error = sanitize_exception_message(e)
-            logger.error(f"Ошибка парсинга ответа от AgentRouter: {safe_error}")
-            last_error = ParsingError(
-                "Не удалось обработать ответ от AgentRouter API. "
-                "Попробуйте еще раз или обратитесь к администратору."
-            )
-            
-            if attempt < settings.agentrouter_max_retries - 1:
-                delay = _calculate_backoff_delay(attempt)
-                logger.info(f"Повтор через {delay:.2f}s")
-                await asyncio.sleep(delay)
-                continue
-            raise last_error
-            
-        except ParsingError:
-            ## Re-raise parsing errors without retry
-            raise
-            
-        except Exception as e:
-            from src.utils.sanitizer import sanitize_exception_message
-            safe_error = sanitize_exception_message(e)
-            logger.error(f"Неожиданная ошибка при запросе к AgentRouter: {safe_error}")
-            last_error = ParsingError(f"Ошибка при обращении к AgentRouter API: {safe_error}")
-            
-            if attempt < settings.agentrouter_max_retries - 1:
-                delay = _calculate_backoff_delay(attempt)
-                logger.info(f"Повтор через {delay:.2f}s")
-                await asyncio.sleep(delay)
-                continue
-            raise last_error
-    
-    ## If we exhausted all retries, raise the last error
-    if last_error:
-        raise last_error
-    
-    raise ParsingError(
-        "Все попытки обращения к AgentRouter API провалились. "
-        "Попробуйте позже."
-    )
+    lower_names = tuple(cat_name.lower() for _, cat_name in categories)
+    return by_lower_name, lower_names, default_match
 
 
 ## Find category by name with similarity matching
@@ -419,7 +729,8 @@ def find_matching_category(
     """
     Find matching category by name from recognized text.
     
-    Searches for category by partial name match (case-insensitive).
+    Searches for category by exact, then fuzzy name match (case-insensitive,
+    rapidfuzz WRatio with CATEGORY_MATCH_SCORE_CUTOFF).
     If not found - returns "Другое" category.
     
     :param category_name: Category name from recognized text
@@ -433,29 +744,28 @@ def find_matching_category(
         >>> print(category_id, name)
         1 "Продукты"
     """
+    categories = tuple((cat.id, cat.name) for cat in available_categories)
+    by_lower_name, lower_names, default_match = _build_category_index(categories, default_category_name)
+    
     if not category_name:
-        # Ищем категорию "Другое"
-        for cat in available_categories:
-            if cat.name == default_category_name:
-                return cat.id, cat.name
-        return None, default_category_name
+        return default_match
     
     category_name_lower = category_name.lower().strip()
     
     # Поиск точного совпадения
-    for cat in available_categories:
-        if cat.name.lower() == category_name_lower:
-            return cat.id, cat.name
-    
-    # Поиск частичного совпадения
-    for cat in available_categories:
-        if category_name_lower in cat.name.lower() or cat.name.lower() in category_name_lower:
-            return cat.id, cat.name
+    exact_match = by_lower_name.get(category_name_lower)
+    if exact_match is not None:
+        return exact_match
+    
+    # Нечёткое совпадение ("продукт" -> "Продукты", "одежда и обувь" -> "Одежда")
+    fuzzy_match = process.extractOne(
+        category_name_lower,
+        lower_names,
+        scorer=fuzz.WRatio,
+        score_cutoff=CATEGORY_MATCH_SCORE_CUTOFF
+    )
+    if fuzzy_match is not None:
+        return categories[fuzzy_match[2]]
     
     # Не найдено - возвращаем "Другое"
-    for cat in available_categories:
-        if cat.name == default_category_name:
-            return cat.id, cat.name
-    
-    return None, default_category_name
-
+    return default_match
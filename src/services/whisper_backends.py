@@ -0,0 +1,233 @@
+"""
+Speech recognition backends for local Whisper.
+
+Each backend loads its model once and transcribes 16 kHz mono float32
+samples synchronously; callers run both steps off the event loop.
+Backend libraries are imported lazily, so only the selected one
+(WHISPER_BACKEND) has to be installed.
+"""
+
+import io
+from abc import ABC, abstractmethod
+
+import numpy as np
+from loguru import logger
+
+## Speech recognition backends (WHISPER_BACKEND)
+WHISPER_BACKEND_WHISPERCPP = "whispercpp"
+WHISPER_BACKEND_FASTER = "faster-whisper"
+
+## Voice messages are transcribed as Russian speech
+TRANSCRIPTION_LANGUAGE = "ru"
+
+## faster-whisper compute type per device: int8 weights on CPU (AVX2/AVX-512 int8 GEMM),
+## int8 weights with FP16 activations on CUDA (Tensor Cores); ~2x less memory, 2-4x faster than FP32
+FASTER_WHISPER_COMPUTE_TYPES = {"cpu": "int8", "cuda": "int8_float16"}
+
+## Silero VAD drops silence/padding before the encoder runs (faster-whisper backend)
+FASTER_WHISPER_VAD_PARAMETERS = {"min_silence_duration_ms": 500}
+
+
+## Speech recognition backend interface
+class TranscriptionBackend(ABC):
+    """
+    Abstract base class for local Whisper backends.
+
+    Defines the interface shared by the different inference engines
+    (Whisper.cpp, faster-whisper). All methods are blocking and are
+    called from worker threads.
+
+    :cvar name: Human-readable backend name for logs
+    """
+
+    name = "Whisper"
+
+    @abstractmethod
+    def load(self) -> None:
+        """
+        Load the model into memory (downloading it on first use).
+        """
+        pass
+
+    @abstractmethod
+    def transcribe(self, audio: np.ndarray) -> str:
+        """
+        Transcribe audio samples to text.
+
+        :param audio: 16 kHz mono float32 samples
+        :return: Recognized text (may be empty)
+        """
+        pass
+
+    def warm_up(self, audio: np.ndarray) -> None:
+        """
+        Run a throwaway decode so buffers are allocated before the first real request.
+
+        :param audio: 16 kHz mono float32 samples (e.g. one second of silence)
+        """
+        self.transcribe(audio)
+
+
+## Whisper.cpp backend (pywhispercpp)
+class WhisperCppBackend(TranscriptionBackend):
+    """
+    Whisper.cpp backend via pywhispercpp.
+
+    Loads ggml weights, quantized (e.g. base-q5_1) unless WHISPER_QUANT
+    is empty or WHISPER_MODEL already names a variant.
+    """
+
+    name = "Whisper.cpp"
+
+    def __init__(self, model_name: str, quant: str, n_threads: int):
+        """
+        Initialize Whisper.cpp backend.
+
+        :param model_name: Model size (WHISPER_MODEL), e.g. base
+        :param quant: Quantization suffix (WHISPER_QUANT), e.g. q5_1; empty for full precision
+        :param n_threads: Number of CPU threads (WHISPER_THREADS)
+        """
+        ## Quantized ggml weights unless WHISPER_MODEL already names a variant
+        if quant and "-q" not in model_name:
+            model_name = f"{model_name}-{quant}"
+        self.model_name = model_name
+        self.n_threads = n_threads
+        self._model = None
+
+    def load(self) -> None:
+        """
+        Download (cached if already exists) and load the Whisper.cpp model.
+        """
+        from pywhispercpp.model import Model
+        from pywhispercpp.utils import download_model
+
+        logger.info(f"Загружаю модель Whisper.cpp: {self.model_name} ({self.n_threads} потоков)")
+        model_path = download_model(self.model_name)
+        logger.success(f"Модель найдена: {model_path}")
+
+        ## Pass model name directly - pywhispercpp handles the rest
+        self._model = Model(self.model_name, n_threads=self.n_threads)
+        logger.success(f"Модель Whisper.cpp '{self.model_name}' успешно загружена")
+
+    def transcribe(self, audio: np.ndarray) -> str:
+        """
+        Transcribe samples, accumulating segment text from the new-segment callback.
+
+        :param audio: 16 kHz mono float32 samples
+        :return: Recognized text (may be empty)
+        """
+        buffer = io.StringIO()
+
+        def on_segment(segment) -> None:
+            buffer.write(segment.text)
+            buffer.write(" ")
+
+        self._model.transcribe(audio, language=TRANSCRIPTION_LANGUAGE, new_segment_callback=on_segment)
+        return buffer.getvalue().strip()
+
+
+## faster-whisper backend (CTranslate2)
+class FasterWhisperBackend(TranscriptionBackend):
+    """
+    faster-whisper (CTranslate2) backend with a batched inference pipeline.
+
+    Weights are quantized at load time (int8 on CPU, int8_float16 on CUDA).
+    BatchedInferencePipeline splits the audio into VAD chunks and decodes
+    up to WHISPER_BATCH_SIZE of them in one forward pass.
+    """
+
+    name = "faster-whisper"
+
+    def __init__(self, model_name: str, device: str, cpu_threads: int, batch_size: int):
+        """
+        Initialize faster-whisper backend.
+
+        :param model_name: Model size or path (WHISPER_MODEL), e.g. base
+        :param device: Inference device (WHISPER_DEVICE): cpu or cuda
+        :param cpu_threads: Number of CPU threads (WHISPER_THREADS)
+        :param batch_size: Audio chunks per forward pass (WHISPER_BATCH_SIZE)
+        """
+        self.model_name = model_name
+        self.device = device
+        self.cpu_threads = cpu_threads
+        self.batch_size = batch_size
+        self._pipeline = None
+
+    def load(self) -> None:
+        """
+        Load the CTranslate2 model and wrap it in a batched pipeline.
+        """
+        from faster_whisper import BatchedInferencePipeline, WhisperModel
+
+        logger.info(
+            f"Загружаю модель faster-whisper: {self.model_name} "
+            f"({self.device}, {self.cpu_threads} потоков)"
+        )
+        model = WhisperModel(
+            self.model_name,
+            device=self.device,
+            compute_type=FASTER_WHISPER_COMPUTE_TYPES[self.device],
+            cpu_threads=self.cpu_threads
+        )
+        self._pipeline = BatchedInferencePipeline(model=model)
+        logger.success(f"Модель faster-whisper '{self.model_name}' успешно загружена")
+
+    def transcribe(self, audio: np.ndarray, vad_filter: bool = True) -> str:
+        """
+        Transcribe samples, consuming the lazy segment generator.
+
+        :param audio: 16 kHz mono float32 samples
+        :param vad_filter: Drop non-speech chunks with Silero VAD before decoding
+        :return: Recognized text (may be empty)
+        """
+        segments, _info = self._pipeline.transcribe(
+            audio,
+            language=TRANSCRIPTION_LANGUAGE,
+            batch_size=self.batch_size,
+            ## Greedy decoding: short voice notes gain nothing from beam search
+            beam_size=1,
+            vad_filter=vad_filter,
+            vad_parameters=FASTER_WHISPER_VAD_PARAMETERS
+        )
+        return " ".join(segment.text.strip() for segment in segments).strip()
+
+    def warm_up(self, audio: np.ndarray) -> None:
+        """
+        Run a throwaway decode with VAD disabled.
+
+        With VAD on, silence yields no speech chunks and the encoder never runs,
+        so the warm-up would allocate nothing.
+
+        :param audio: 16 kHz mono float32 samples (e.g. one second of silence)
+        """
+        self.transcribe(audio, vad_filter=False)
+
+
+## Create backend selected in settings
+def create_transcription_backend(settings) -> TranscriptionBackend:
+    """
+    Create the speech recognition backend selected by WHISPER_BACKEND.
+
+    The model is not loaded yet; call load() in a worker thread.
+
+    :param settings: Application settings
+    :return: Unloaded transcription backend
+
+    Example:
+        >>> backend = create_transcription_backend(get_settings())
+        >>> backend.load()
+        >>> backend.transcribe(samples)
+        "Потратил 500 рублей на продукты"
+    """
+    if settings.whisper_backend == WHISPER_BACKEND_FASTER:
+        return FasterWhisperBackend(
+            settings.whisper_model,
+            device=settings.whisper_device,
+            cpu_threads=settings.whisper_threads,
+            batch_size=settings.whisper_batch_size
+        )
+    return WhisperCppBackend(
+        settings.whisper_model,
+        quant=settings.whisper_quant,
+        n_threads=settings.whisper_threads
+    )
@@ -7,6 +7,7 @@ from src.states.voice_states import VoiceTransactionStates
 from src.states.view_states import ViewTransactionsStates, EditTransactionStates
 from src.states.category_states import CategoryStates
 from src.states.export_states import ExportStates
+from src.states.settings_states import SettingsStates
 
 __all__ = [
     "AddTransactionStates",
@@ -15,5 +16,6 @@ __all__ = [
     "EditTransactionStates",
     "CategoryStates",
     "ExportStates",
+    "SettingsStates",
 ]
 
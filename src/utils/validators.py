@@ -6,12 +6,52 @@
 """
 
 import re
-import html
 import time
+from time import monotonic as _now
+from collections import OrderedDict, deque
 from typing import Optional, Protocol
 from decimal import Decimal, InvalidOperation
 from abc import ABC, abstractmethod
 
+## Таблица экранирования HTML (как html.escape) и удаления управляющих символов
+# (кроме переноса строки и табуляции) за один проход str.translate
+_ESCAPE_AND_STRIP = {
+    **dict.fromkeys(
+        [*range(0x00, 0x09), 0x0b, 0x0c, *range(0x0e, 0x20), *range(0x7f, 0xa0)]
+    ),
+    ord("&"): "&amp;",
+    ord("<"): "&lt;",
+    ord(">"): "&gt;",
+    ord('"'): "&quot;",
+    ord("'"): "&#x27;",
+}
+
+# Символы, которые изменит _ESCAPE_AND_STRIP (быстрая проверка чистого текста)
+_NEEDS_ESCAPE_RE = re.compile(r'[<>&"\'\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\x9f]')
+
+## Таблица очистки суммы: запятая -> точка, без валюты и пробелов
+# (включая неразрывные пробелы-разделители разрядов: "1 000")
+_AMOUNT_TABLE = str.maketrans({",": ".", "₽": None, " ": None, "\u00a0": None, "\u202f": None})
+
+## Предкомпилированный шаблон формата суммы
+_AMOUNT_RE = re.compile(r'^\d+(\.\d{1,2})?$')
+
+## Недопустимые символы в названии категории
+_BAD_NAME_CHARS = frozenset('<>"\'`')
+
+## Диапазоны кодовых точек эмодзи
+_EMOJI_RANGES = (
+    (0x1F600, 0x1F64F),  # emoticons
+    (0x1F300, 0x1F5FF),  # symbols & pictographs
+    (0x1F680, 0x1F6FF),  # transport & map symbols
+    (0x1F1E0, 0x1F1FF),  # flags (iOS)
+    (0x2702, 0x27B0),
+    (0x24C2, 0x1F251),
+)
+# Соединитель (ZWJ) и селектор варианта в составных эмодзи
+_EMOJI_JOINERS = frozenset((0x200D, 0xFE0F))
+
+
 ## Защита от XSS: очистка HTML-тегов
 def sanitize_text(text: str, max_length: Optional[int] = None) -> str:
     """
@@ -25,18 +65,17 @@ def sanitize_text(text: str, max_length: Optional[int] = None) -> str:
     
     Example:
         >>> sanitize_text("<script>alert('XSS')</script>")
-        "&lt;script&gt;alert('XSS')&lt;/script&gt;"
+        "&lt;script&gt;alert(&#x27;XSS&#x27;)&lt;/script&gt;"
     """
     if not text:
         return ""
     
     text = text.strip()
     
-    # Экранируем HTML
-    text = html.escape(text)
-    
-    # Удаляем управляющие символы (кроме переноса строки и табуляции)
-    text = re.sub(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\x9f]', '', text)
+    # Экранируем HTML и удаляем управляющие символы за один проход,
+    # только если в тексте есть что менять
+    if _NEEDS_ESCAPE_RE.search(text):
+        text = text.translate(_ESCAPE_AND_STRIP)
     
     if max_length and len(text) > max_length:
         text = text[:max_length]
@@ -62,10 +101,10 @@ def validate_amount(amount_str: str) -> tuple[bool, Optional[Decimal], Optional[
     """
     try:
         # Очищаем от валюты и пробелов
-        cleaned = amount_str.replace(",", ".").replace("₽", "").replace(" ", "")
+        cleaned = amount_str.translate(_AMOUNT_TABLE)
         
-        # Проверяем формат числа
-        if not re.match(r'^\d+(\.\d{1,2})?$', cleaned):
+        # Проверяем формат числа (не более 2 знаков после точки)
+        if not _AMOUNT_RE.match(cleaned):
             return False, None, "❌ Некорректный формат суммы. Используйте только цифры и точку."
         
         amount = Decimal(cleaned)
@@ -76,10 +115,6 @@ def validate_amount(amount_str: str) -> tuple[bool, Optional[Decimal], Optional[
         if amount > 10_000_000:
             return False, None, "❌ Сумма слишком большая (максимум 10 000 000)."
         
-        # Проверяем количество знаков после запятой
-        if amount.as_tuple().exponent < -2:
-            return False, None, "❌ Слишком много знаков после запятой (максимум 2)."
-        
         return True, amount, None
         
     except (ValueError, InvalidOperation):
@@ -111,7 +146,7 @@ def validate_category_name(name: str) -> tuple[bool, Optional[str]]:
         return False, "❌ Название слишком длинное (максимум 50 символов)."
     
     # Проверяем на опасные символы
-    if re.search(r'[<>\"\'`]', name):
+    if not _BAD_NAME_CHARS.isdisjoint(name):
         return False, "❌ Название содержит недопустимые символы."
     
     return True, None
@@ -151,22 +186,17 @@ def validate_emoji(emoji: str) -> tuple[bool, Optional[str]]:
         >>> validate_emoji("ABC")
         (False, "❌ Должен быть эмодзи.")
     """
-    # Простая проверка на эмодзи (Unicode ranges)
-    emoji_pattern = re.compile(
-        "["
-        "\U0001F600-\U0001F64F"  # emoticons
-        "\U0001F300-\U0001F5FF"  # symbols & pictographs
-        "\U0001F680-\U0001F6FF"  # transport & map symbols
-        "\U0001F1E0-\U0001F1FF"  # flags (iOS)
-        "\U00002702-\U000027B0"
-        "\U000024C2-\U0001F251"
-        "]+",
-        flags=re.UNICODE
-    )
-    
-    if not emoji_pattern.match(emoji):
+    if not emoji:
         return False, "❌ Должен быть эмодзи."
     
+    # Проверяем каждую кодовую точку по диапазонам без regex
+    for ch in emoji:
+        cp = ord(ch)
+        if cp in _EMOJI_JOINERS:
+            continue
+        if not any(lo <= cp <= hi for lo, hi in _EMOJI_RANGES):
+            return False, "❌ Должен быть эмодзи."
+    
     if len(emoji) > 10:
         return False, "❌ Слишком много эмодзи (максимум 10 символов)."
     
@@ -182,6 +212,8 @@ class RateLimiterBackend(ABC):
     (in-memory, Redis, etc.).
     """
     
+    __slots__ = ()
+    
     @abstractmethod
     async def check_rate_limit(
         self,
@@ -207,11 +239,44 @@ class InMemoryRateLimiterBackend(RateLimiterBackend):
     
     Stores request timestamps in memory. Not suitable for production
     with multiple processes, but works as a development fallback.
+    
+    Histories are keyed by (user_id, time_window), so limiters with
+    different windows sharing one backend neither count each other's
+    requests nor expire each other's entries.
     """
     
-    def __init__(self):
-        """Initialize in-memory storage."""
-        self._requests: dict[int, list[float]] = {}
+    __slots__ = ("_requests", "_max_users", "_checks_since_sweep")
+    
+    # Number of checks between sweeps of idle users
+    SWEEP_INTERVAL = 1000
+    
+    def __init__(self, max_users: int = 10_000):
+        """
+        Initialize in-memory storage.
+        
+        :param max_users: Maximum number of tracked (user, window) histories;
+            least recently active ones are evicted beyond this limit
+        """
+        self._requests: OrderedDict[tuple[int, int], deque[float]] = OrderedDict()
+        self._max_users = max_users
+        self._checks_since_sweep = 0
+    
+    def _sweep(self, current_time: float) -> None:
+        """
+        Drop histories whose newest request is outside their own time window.
+        
+        Histories are kept in least-recently-active order, so idle ones sit
+        at the front; the sweep stops at the first active one instead of
+        scanning every tracked user.
+        
+        :param current_time: Current monotonic time
+        """
+        requests = self._requests
+        while requests:
+            key, timestamps = next(iter(requests.items()))
+            if timestamps and current_time - timestamps[-1] < key[1]:
+                break
+            del requests[key]
     
     async def check_rate_limit(
         self,
@@ -222,41 +287,68 @@ class InMemoryRateLimiterBackend(RateLimiterBackend):
         """
         Check rate limit using in-memory storage.
         
+        Keeps a sliding window of request timestamps per user in a deque,
+        so expired entries are dropped from the head in amortized O(1).
+        
         :param user_id: User ID
         :param max_requests: Maximum number of requests allowed
         :param time_window: Time window in seconds
         :return: Tuple (allowed, error_message)
         """
-        current_time = time.time()
+        current_time = _now()
         
-        if user_id not in self._requests:
-            self._requests[user_id] = []
+        # Periodically forget idle users to cap memory
+        self._checks_since_sweep += 1
+        if self._checks_since_sweep >= self.SWEEP_INTERVAL:
+            self._checks_since_sweep = 0
+            self._sweep(current_time)
+        
+        key = (user_id, time_window)
+        timestamps = self._requests.get(key)
+        if timestamps is None:
+            timestamps = self._requests[key] = deque()
+            if len(self._requests) > self._max_users:
+                self._requests.popitem(last=False)
+        else:
+            self._requests.move_to_end(key)
         
         # Remove old requests outside time window
-        self._requests[user_id] = [
-            req_time for req_time in self._requests[user_id]
-            if current_time - req_time < time_window
-        ]
+        while timestamps and current_time - timestamps[0] >= time_window:
+            timestamps.popleft()
         
         # Check if limit exceeded
-        if len(self._requests[user_id]) >= max_requests:
+        if len(timestamps) >= max_requests:
             return False, f"⏱ Слишком много запросов. Попробуйте через {time_window} секунд."
         
         # Add current request
-        self._requests[user_id].append(current_time)
+        timestamps.append(current_time)
         
         return True, None
 
 
+## Redis rate limit script: INCR and EXPIRE on the first hit of a window bucket
+# Returns the request count in the bucket
+_RATE_LIMIT_LUA = """
+local count = redis.call('INCR', KEYS[1])
+if count == 1 then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return count
+"""
+
+
 ## Redis rate limiter backend (production-ready)
 class RedisRateLimiterBackend(RateLimiterBackend):
     """
     Redis-based rate limiter backend.
     
-    Uses Redis INCR and EXPIRE commands for distributed rate limiting.
+    Counts requests in fixed time-window buckets (one key per user and
+    window) with a single Lua script call for distributed rate limiting.
     Suitable for production with multiple processes/instances.
     """
     
+    __slots__ = ("_redis", "_script")
+    
     def __init__(self, redis_client):
         """
         Initialize Redis backend.
@@ -264,6 +356,8 @@ class RedisRateLimiterBackend(RateLimiterBackend):
         :param redis_client: Redis client instance (aioredis or redis.asyncio)
         """
         self._redis = redis_client
+        # EVALSHA with automatic SCRIPT LOAD on NOSCRIPT
+        self._script = redis_client.register_script(_RATE_LIMIT_LUA)
     
     async def check_rate_limit(
         self,
@@ -274,32 +368,28 @@ class RedisRateLimiterBackend(RateLimiterBackend):
         """
         Check rate limit using Redis storage.
         
-        Uses Redis INCR to atomically increment counter and EXPIRE
-        to set TTL on the key. This ensures accurate rate limiting
-        across multiple processes/instances.
+        The key includes the current window number, so counters roll over
+        on their own; the key only gets a TTL of two windows on its first
+        request so stale buckets are cleaned up. Time until the next window
+        is computed locally without extra Redis calls. This ensures accurate
+        rate limiting across multiple processes/instances.
         
         :param user_id: User ID
         :param max_requests: Maximum number of requests allowed
         :param time_window: Time window in seconds
         :return: Tuple (allowed, error_message)
         """
-        key = f"rate_limit:user:{user_id}"
+        window, elapsed = divmod(int(time.time()), time_window)
+        key = f"rate_limit:user:{user_id}:{window}"
         
         try:
-            # Increment counter atomically
-            current_count = await self._redis.incr(key)
-            
-            # Set expiration on first request in window
-            if current_count == 1:
-                await self._redis.expire(key, time_window)
+            current_count = await self._script(keys=[key], args=[time_window * 2])
             
             # Check if limit exceeded
             if current_count > max_requests:
-                # Get TTL to show user when they can retry
-                ttl = await self._redis.ttl(key)
-                if ttl > 0:
-                    return False, f"⏱ Слишком много запросов. Попробуйте через {ttl} секунд."
-                return False, f"⏱ Слишком много запросов. Попробуйте через {time_window} секунд."
+                # Show time until the next window so user knows when they can retry
+                retry_after = time_window - elapsed
+                return False, f"⏱ Слишком много запросов. Попробуйте через {retry_after} секунд."
             
             return True, None
             
@@ -320,6 +410,8 @@ class RateLimiter:
     Automatically falls back to in-memory if Redis is unavailable.
     """
     
+    __slots__ = ("_backend",)
+    
     def __init__(self, backend: RateLimiterBackend):
         """
         Initialize rate limiter with specific backend.